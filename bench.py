@@ -0,0 +1,307 @@
+"""
+Benchmarks for the hot paths of washitsu.
+
+    python bench.py                          # 1k words
+    python bench.py --size 1k 100k 1M        # every lexicon size
+    python bench.py --save before.json
+    python bench.py --compare before.json    # print the change against a saved run
+
+Every benchmark is timed on a synthetic lexicon made from a fixed seed, so runs on
+different commits see the same words. Time is the best of `--repeat` runs. Peak
+memory is measured with `tracemalloc` in a separate run, since tracing slows the
+code down.
+"""
+
+from __future__ import annotations
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import typing as t
+
+from washitsu import (
+    close,
+    find,
+    front,
+    ipa,
+    nasal,
+    optional,
+    select,
+    sonorant,
+    syllabic,
+    syllabify_string,
+    syllable,
+    voiced,
+)
+import washitsu.rules
+from washitsu.cache import CACHES
+from washitsu.generate import Generator
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+
+# `import washitsu` should stay under this, since the command line tool and
+# worker processes pay it on every start.
+IMPORT_BUDGET = 0.05
+
+segments = ipa(
+    "m",
+    "n",
+    "p",
+    "t",
+    "k",
+    "b",
+    "d",
+    "g",
+    "s",
+    "z",
+    "x",
+    "h",
+    "l",
+    "r",
+    "j",
+    "w",
+    "i",
+    "y",
+    "u",
+    "e",
+    "o",
+    "a",
+)
+
+onset = [-syllabic & optional]
+nucleus = [syllabic]
+coda = [-syllabic & optional]
+
+
+class Corpus:
+    def __init__(self, size: int) -> None:
+        generator = Generator(
+            segments, [(-syllabic, 0.8)], [syllabic], [(-syllabic, 0.3)]
+        )
+        self.words = generator.words(size, syllables=(1, 4), rng=0)
+        self.symbols = [
+            [segment.ipa_symbol for segment in word.flatten()] for word in self.words
+        ]
+        self.strings = ["".join(symbols) for symbols in self.symbols]
+
+
+BENCHMARKS: dict[str, t.Callable[[Corpus], t.Any]] = {}
+
+
+def benchmark(name: str):
+    def wrap(f: t.Callable[[Corpus], t.Any]):
+        BENCHMARKS[name] = f
+        return f
+
+    return wrap
+
+
+@benchmark("ipa")
+def bench_ipa(corpus: Corpus):
+    for symbols in corpus.symbols:
+        ipa(*symbols)
+
+
+@benchmark("find")
+def bench_find(corpus: Corpus):
+    for symbols in corpus.symbols:
+        for symbol in symbols:
+            find(symbol)
+
+
+@benchmark("select")
+def bench_select(corpus: Corpus):
+    for symbols in corpus.symbols:
+        for symbol in symbols:
+            select(symbol)
+
+
+@benchmark("predicate")
+def bench_predicate(corpus: Corpus):
+    predicates = [voiced & -sonorant, syllabic | nasal, -(close & front)]
+    for word in corpus.words:
+        for segment in word.flatten():
+            for predicate in predicates:
+                predicate(segment.mask)
+
+
+@benchmark("syllable")
+def bench_syllable(corpus: Corpus):
+    for _ in corpus.words:
+        syllable(segments, [-syllabic], [syllabic], [])
+
+
+@benchmark("syllabify")
+def bench_syllabify(corpus: Corpus):
+    for string in corpus.strings:
+        syllabify_string(string, onset, nucleus, coda)
+
+
+def _rule(rule):
+    def run(corpus: Corpus):
+        for word in corpus.words:
+            word.then(rule)
+
+    return run
+
+
+for name in [
+    "voicing_assim",
+    "intervocalic_voicing",
+    "rhoticization",
+    "gnarsh_chain_shift",
+    "umlaut",
+    "great_vowel_shift",
+    "syllabification_test",
+]:
+    benchmark(f"rules.{name}")(_rule(getattr(washitsu.rules, name)))
+
+
+@benchmark("matches")
+def bench_matches(corpus: Corpus):
+    before, after = [syllabic], [-syllabic & optional]
+    for word in corpus.words:
+        for segment in word.flatten():
+            word.matches(before, segment, after)
+
+
+@benchmark("show")
+def bench_show(corpus: Corpus):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for word in corpus.words:
+            word.show()
+
+
+def _reset() -> None:
+    for cache in CACHES.values():
+        cache.clear()
+    gc.collect()
+
+
+def measure(f: t.Callable[[Corpus], t.Any], corpus: Corpus, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        _reset()
+        start = time.perf_counter()
+        f(corpus)
+        best = min(best, time.perf_counter() - start)
+
+    _reset()
+    tracemalloc.start()
+    f(corpus)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_bytes": peak}
+
+
+def import_time(repeat: int) -> float:
+    """
+    The time to import washitsu in a fresh interpreter.
+    """
+    code = (
+        "import time; start = time.perf_counter(); import washitsu; "
+        "print(time.perf_counter() - start)"
+    )
+    return min(
+        float(
+            subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True,
+                check=True,
+                text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout
+        )
+        for _ in range(repeat)
+    )
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def show_size(size: int) -> str:
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def report(results: dict, baseline: dict | None) -> None:
+    def change(new: float, old: float | None) -> str:
+        if not old:
+            return ""
+        return f"{new / old:6.2f}x"
+
+    old_import = baseline["import_seconds"] if baseline else None
+    print(
+        f"import                      {results['import_seconds'] * 1000:10.1f} ms"
+        f"              {change(results['import_seconds'], old_import)}"
+    )
+    if results["import_seconds"] > IMPORT_BUDGET:
+        print(f"  over the budget of {IMPORT_BUDGET * 1000:.0f} ms")
+    for size, benchmarks in results["sizes"].items():
+        print(f"\n{size} words")
+        old_benchmarks = (baseline or {}).get("sizes", {}).get(size, {})
+        for name, result in benchmarks.items():
+            old = old_benchmarks.get(name, {})
+            print(
+                f"  {name:26}{result['seconds'] * 1000:10.1f} ms"
+                f"{show_size(result['peak_bytes']):>12}"
+                f"  {change(result['seconds'], old.get('seconds'))}"
+                f"  {change(result['peak_bytes'], old.get('peak_bytes'))}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", nargs="+", choices=SIZES, default=["1k"])
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="write the results to a JSON file")
+    parser.add_argument("--compare", help="a JSON file from an earlier --save")
+    args = parser.parse_args()
+
+    results = {
+        "commit": commit(),
+        "python": platform.python_version(),
+        "import_seconds": import_time(args.repeat),
+        "sizes": {},
+    }
+    for size in args.size:
+        corpus = Corpus(SIZES[size])
+        results["sizes"][size] = {
+            name: measure(BENCHMARKS[name], corpus, args.repeat)
+            for name in args.only or BENCHMARKS
+        }
+        del corpus
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from washitsu import *
+from washitsu.generate import Generator
 from washitsu.rules import *
 import random
 
@@ -19,20 +20,7 @@ segments = ipa(
     "l",
 )
 
-for i in range(0, 10):
-    word_length = random.randint(1, 5)
-    (
-        Word(
-            [
-                a(
-                    segments,
-                    [probability(-syllabic, 0.8)],
-                    [+syllabic],
-                    [],
-                )
-                for a in [syllable] * word_length
-            ]
-        ).show()
-        .then(syllabification_test)
-        .show()
-    )
+generator = Generator(segments, [(-syllabic, 0.8)], [+syllabic], [])
+
+for word in generator.words(10, syllables=(1, 5), rng=random.Random()):
+    word.show().then(syllabification_test).show()
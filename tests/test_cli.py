@@ -0,0 +1,33 @@
+import io
+
+import pytest
+
+from washitsu.cli import main
+
+
+def run(monkeypatch, *argv: str) -> str:
+    output = io.StringIO()
+    monkeypatch.setattr("sys.stdin", io.StringIO("zaza\npi\n"))
+    monkeypatch.setattr("sys.stdout", output)
+    main(list(argv))
+    return output.getvalue()
+
+
+def test_rules(monkeypatch):
+    assert run(monkeypatch, "washitsu.rules:rhoticization") == "ra.ra.\npi.\n"
+
+
+@pytest.mark.parametrize(
+    "argv, name",
+    [
+        (["washitsu.rules:nothing"], "washitsu.rules:nothing"),
+        (["washitsu.nothing:umlaut"], "washitsu.nothing:umlaut"),
+        (["washitsu.rules"], "washitsu.rules"),
+        (["-t", "washitsu.rules:nothing"], "washitsu.rules:nothing"),
+    ],
+)
+def test_unknown_names(monkeypatch, capsys, argv, name):
+    with pytest.raises(SystemExit) as exit:
+        run(monkeypatch, *argv)
+    assert exit.value.code == 2
+    assert name in capsys.readouterr().err
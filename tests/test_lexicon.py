@@ -0,0 +1,81 @@
+from washitsu import consonantal, find, ipa, select, syllabic, voiced
+from washitsu.batch import Change, apply
+from washitsu.generate import Generator
+from washitsu.lexicon import Lexicon
+from washitsu.rules import (
+    great_vowel_shift,
+    intervocalic_voicing,
+    rhoticization,
+    syllabification_test,
+    umlaut,
+    voicing_assim,
+)
+from washitsu.transducer import Rule, boundary
+
+SEGMENTS = ipa(
+    "m", "n", "p", "t", "k", "b", "d", "g", "s", "z", "x", "h", "l", "r", "j", "w",
+    "i", "y", "u", "e", "o", "a",
+)  # fmt: skip
+
+WORDS = Generator(
+    SEGMENTS, [(-syllabic, 0.8)], [syllabic], [(-syllabic, 0.3)]
+).words(500, syllables=(1, 4), rng=7)
+
+CASCADES = [
+    [Change(-syllabic, add=[voiced], before=[syllabic], after=[syllabic])],
+    [
+        Change(syllabic, remove=[voiced], after=[-syllabic]),
+        Change(consonantal, add=[voiced], before=[-voiced]),
+    ],
+    [rhoticization, great_vowel_shift, umlaut],
+    [Rule(select("x"), None, [syllabic], [boundary]), voicing_assim],
+    [Rule(select("a"), [find("a"), find("j")]), intervocalic_voicing],
+    [
+        Change(-syllabic, add=[voiced], before=[syllabic], after=[syllabic]),
+        rhoticization,
+        syllabification_test,
+        Change(syllabic, remove=[voiced]),
+        umlaut,
+    ],
+]
+
+
+def expected(words, rules):
+    output = []
+    for word in words:
+        for rule in rules:
+            word = word.then(rule)
+        output.append(word)
+    return output
+
+
+def render(words):
+    return [word.render() for word in words]
+
+
+def test_apply_matches_word_then():
+    for rules in CASCADES:
+        assert render(apply(WORDS, *rules)) == render(expected(WORDS, rules))
+
+
+def test_lexicon_then_matches_word_then():
+    for rules in CASCADES:
+        output = Lexicon(WORDS).then(*rules)
+        assert render(output) == render(expected(WORDS, rules))
+
+
+def test_lexicon_then_keeps_the_index():
+    for rules in CASCADES:
+        lexicon = Lexicon(WORDS)
+        lexicon.postings()
+        output = lexicon.then(*rules)
+        assert output.postings() == Lexicon(list(output)).postings()
+        assert lexicon.postings() == Lexicon(WORDS).postings()
+
+
+def test_unchanged_words_are_shared():
+    change = Change(select("x"), add=[voiced])
+    output = apply(WORDS, change)
+    for before, after in zip(WORDS, output):
+        if not before.includes(select("x")):
+            assert after is before
@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import pytest
+
+from washitsu.server import Client, Server
+
+
+def serve(test, **options):
+    """
+    Run `test(server, port)` against a server listening on a free port.
+    """
+
+    async def run():
+        server = Server(**options)
+        listener = await server.start()
+        try:
+            async with listener:
+                port = listener.sockets[0].getsockname()[1]
+                await asyncio.wait_for(test(server, port), 10)
+        finally:
+            await server.close()
+
+    asyncio.run(run())
+
+
+async def send(port, *lines: bytes) -> list[dict]:
+    """
+    Send raw lines and read responses until the server closes the connection.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for line in lines:
+        writer.write(line + b"\n")
+    await writer.drain()
+    writer.write_eof()
+    output = [json.loads(line) async for line in reader]
+    writer.close()
+    return output
+
+
+def test_evolve():
+    async def test(server, port):
+        client = await Client.connect(port=port)
+        assert await client.ping()
+        words = await client.evolve(["zaza", "pi"], ["washitsu.rules:rhoticization"])
+        assert words == ["ra.ra.", "pi."]
+        assert len(await client.generate(3, (1, 2), seed=1)) == 3
+        await client.close()
+
+    serve(test)
+
+
+def test_requests_that_are_not_objects():
+    async def test(server, port):
+        responses = await send(port, b"[1, 2]", b"not json", b'{"op": "ping"}')
+        assert len(responses) == 3
+        assert {"error": "Expected a JSON object", "id": None} in responses
+        assert {"ok": True, "id": None} in responses
+        assert sum("error" in response for response in responses) == 2
+
+    serve(test)
+
+
+@pytest.mark.parametrize(
+    "request_, message",
+    [
+        ({"words": "pa"}, "Expected a list of words"),
+        ({"words": ["pa"], "rules": "washitsu.rules:umlaut"}, "rule names"),
+        ({"words": ["pa"], "rules": [1]}, "rule names"),
+        ({"words": ["pa"], "template": 3}, "template name"),
+    ],
+)
+def test_invalid_evolve_requests(request_, message):
+    async def test(server, port):
+        client = await Client.connect(port=port)
+        with pytest.raises(Exception, match=message):
+            await client.request({"op": "evolve", **request_})
+        assert await client.ping()
+        await client.close()
+
+    serve(test)
+
+
+def test_failed_rules_do_not_stop_the_server():
+    async def test(server, port):
+        client = await Client.connect(port=port)
+        with pytest.raises(Exception):
+            await client.evolve(["pa"], ["washitsu.rules:nothing"])
+        with pytest.raises(Exception):
+            await client.evolve(["pa"], ["washitsu.rules"])
+        with pytest.raises(Exception):
+            await client.evolve(["pa"], [], template="washitsu.rules:umlaut")
+        words = await client.evolve(["zaza"], ["washitsu.rules:rhoticization"])
+        assert words == ["ra.ra."]
+        await client.close()
+
+    serve(test)
+
+
+def test_long_request_ends_the_connection():
+    async def test(server, port):
+        responses = await send(port, b'{"op": "ping", "id": 1}', b"x" * 4096)
+        # Requests are answered as they finish, not in order.
+        ok, error = sorted(responses, key=lambda response: response["id"] is None)
+        assert ok == {"ok": True, "id": 1}
+        assert error["id"] is None
+        assert "longer than 1024 bytes" in error["error"]
+
+        client = await Client.connect(port=port)
+        with pytest.raises(ConnectionError, match="longer than 1024 bytes"):
+            await client.evolve(["pa" * 1000], [])
+        with pytest.raises(ConnectionError):
+            await client.ping()
+        await client.close()
+
+    serve(test, batch=1)
+
+
+def test_waiting_requests_fail_when_the_response_is_too_long():
+    async def test(server, port):
+        client = await Client.connect(port=port, limit=64)
+        with pytest.raises(ConnectionError):
+            await client.generate(100, (3, 3), seed=1)
+        await client.close()
+
+    serve(test)
@@ -0,0 +1,118 @@
+import sys
+
+import pytest
+
+from washitsu import each_segment, find, ipa, select, syllabic, syllabify, voiced
+from washitsu.batch import Change
+from washitsu.lexicon import Lexicon
+from washitsu.stages import StageCache, identity
+
+TEMPLATE = ([-syllabic], [syllabic], [])
+WORDS = [
+    syllabify(ipa(*word), *TEMPLATE)
+    for word in [("p", "a", "t", "a"), ("s", "i", "k", "u"), ("t", "a", "p", "i")]
+]
+
+TARGET = select("p")
+
+
+@each_segment
+def lenition(word, segment):
+    if segment.has(TARGET):
+        return find("f")
+    return segment
+
+
+voicing = Change(-syllabic, add=[voiced], before=[syllabic])
+
+
+class Opaque:
+    def __call__(self, word):
+        return word
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    """
+    The rules applied by `Lexicon.then`, in order.
+    """
+    output = []
+    then = Lexicon.then
+
+    def record(self, *rules):
+        output.extend(rules)
+        return then(self, *rules)
+
+    monkeypatch.setattr(Lexicon, "then", record)
+    return output
+
+
+def render(lexicon):
+    return [word.render() for word in lexicon]
+
+
+def test_checkpoints_are_reused(tmp_path, applied):
+    cache = StageCache(str(tmp_path))
+    first = cache.run(WORDS, lenition, voicing)
+    assert applied == [lenition, voicing]
+
+    applied.clear()
+    second = cache.run(WORDS, lenition, voicing)
+    assert applied == []
+    assert render(second) == render(first)
+
+    applied.clear()
+    cache.run(WORDS, lenition)
+    assert applied == []
+
+
+def test_changed_global_invalidates_later_stages(tmp_path, applied, monkeypatch):
+    cache = StageCache(str(tmp_path))
+    cache.run(WORDS, voicing, lenition)
+    before = cache.keys(Lexicon(WORDS), [voicing, lenition])
+
+    monkeypatch.setattr(sys.modules[__name__], "TARGET", select("t"))
+    after = cache.keys(Lexicon(WORDS), [voicing, lenition])
+    assert before[:2] == after[:2]
+    assert before[2] != after[2]
+
+    applied.clear()
+    output = cache.run(WORDS, voicing, lenition)
+    assert applied == [lenition]
+    expected = [word.then(voicing).then(lenition) for word in WORDS]
+    assert render(output) == render(expected)
+
+
+def test_changed_input_invalidates_every_stage(tmp_path, applied):
+    cache = StageCache(str(tmp_path))
+    cache.run(WORDS, lenition, voicing)
+    applied.clear()
+    cache.run(WORDS[:2], lenition, voicing)
+    assert applied == [lenition, voicing]
+
+
+def test_rules_without_identity_are_not_cached(tmp_path, applied):
+    opaque = Opaque()
+    assert identity(opaque) is None
+
+    cache = StageCache(str(tmp_path))
+    keys = cache.keys(Lexicon(WORDS), [lenition, opaque, voicing])
+    assert keys[1] is not None
+    assert keys[2] is None and keys[3] is None
+
+    cache.run(WORDS, lenition, opaque, voicing)
+    applied.clear()
+    cache.run(WORDS, lenition, opaque, voicing)
+    assert applied == [opaque, voicing]
+
+
+def test_eviction(tmp_path):
+    cache = StageCache(str(tmp_path), max_bytes=0)
+    cache.run(WORDS, lenition, voicing)
+    assert cache.size() == 0
+
+    cache = StageCache(str(tmp_path))
+    cache.run(WORDS, lenition, voicing)
+    assert cache.size() > 0
+    cache.clear()
+    assert cache.size() == 0
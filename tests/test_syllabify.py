@@ -0,0 +1,105 @@
+import itertools
+
+import pytest
+
+from washitsu import (
+    consonantal,
+    ipa,
+    optional,
+    repeat,
+    requires,
+    syllabic,
+    syllabify,
+    syllabify_string,
+)
+
+# Slots that are neither skipped nor repeated unless made so with `& optional` or
+# `& repeat`.
+C = consonantal & -syllabic
+V = syllabic & -consonantal
+
+
+def render(string, onset, nucleus, coda):
+    return syllabify_string(string, onset, nucleus, coda).render()
+
+
+def test_required_slots():
+    assert render("pata", [C], [V], []) == "pa.ta."
+    with pytest.raises(Exception):
+        render("apa", [C], [V], [])
+    with pytest.raises(Exception):
+        render("pat", [C], [V], [])
+
+
+def test_optional_slots():
+    assert render("apa", [C & optional], [V], []) == "a.pa."
+    assert render("pat", [C], [V], [C & optional]) == "pat."
+    with pytest.raises(Exception):
+        render("pta", [C & optional], [V], [])
+
+
+def test_repeated_slots():
+    assert render("stra", [C & repeat], [V], []) == "stra."
+    assert render("astra", [C & optional & repeat], [V], []) == "a.stra."
+    assert render("ia", [C & optional], [V], []) == "i.a."
+    assert render("ia", [C & optional], [V & repeat], []) == "ia."
+    with pytest.raises(Exception):
+        render("stra", [C], [V], [])
+
+
+def test_onsets_before_codas():
+    template = [C & optional], [V], [C & optional]
+    assert render("apa", *template) == "a.pa."
+    assert render("patka", *template) == "pat.ka."
+    template = [C & optional & repeat], [V], [C & optional & repeat]
+    assert render("astra", *template) == "a.stra."
+
+
+def fits(segments, slots) -> bool:
+    if not slots:
+        return not segments
+    slot, rest = slots[0], slots[1:]
+    if requires(slot, optional) and fits(segments, rest):
+        return True
+    if segments and slot(segments[0].mask | optional.mask | repeat.mask):
+        if fits(segments[1:], rest):
+            return True
+        return requires(slot, repeat) and fits(segments[1:], slots)
+    return False
+
+
+def parses(segments, onset, nucleus, coda):
+    """
+    Every way to split `segments` into syllables that fit the template, by brute
+    force.
+    """
+    if not segments:
+        yield []
+        return
+    for end in range(1, len(segments) + 1):
+        for i, j in itertools.combinations_with_replacement(range(end + 1), 2):
+            parts = segments[:i], segments[i:j], segments[j:end]
+            if all(fits(*pair) for pair in zip(parts, (onset, nucleus, coda))):
+                key = tuple(tuple(s.mask for s in part) for part in parts)
+                for rest in parses(segments[end:], onset, nucleus, coda):
+                    yield [key, *rest]
+
+
+def test_parse_is_valid():
+    segments = ipa("p", "t", "s", "i", "a")
+    templates = [
+        ([C & optional], [V], [C & optional]),
+        ([C & optional & repeat], [V], [C & optional]),
+        ([C], [V & repeat], [C & optional & repeat]),
+        ([C & optional, C & optional], [V], []),
+    ]
+    for onset, nucleus, coda in templates:
+        for size in range(1, 5):
+            for word in itertools.product(segments, repeat=size):
+                valid = list(parses(list(word), onset, nucleus, coda))
+                if not valid:
+                    with pytest.raises(Exception):
+                        syllabify(word, onset, nucleus, coda)
+                    continue
+                output = syllabify(word, onset, nucleus, coda)
+                assert [syllable.key() for syllable in output.syllables] in valid
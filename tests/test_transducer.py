@@ -0,0 +1,122 @@
+import random
+
+from washitsu import (
+    Segment,
+    consonantal,
+    find,
+    ipa,
+    optional,
+    repeat,
+    requires,
+    select,
+    syllabic,
+    syllabify,
+    voiced,
+)
+from washitsu.transducer import Rule, boundary
+
+SEGMENTS = ipa("p", "t", "k", "b", "d", "s", "z", "m", "n", "l", "i", "u", "a")
+TEMPLATE = (
+    [-syllabic & optional & repeat],
+    [syllabic],
+    [-syllabic & optional & repeat],
+)
+
+
+def matches(predicate, item) -> bool:
+    if predicate is boundary or item is boundary:
+        return predicate is item
+    return bool(predicate(item.mask | optional.mask | repeat.mask))
+
+
+def full(items, predicates) -> bool:
+    """
+    Whether `items` match `predicates` exactly, trying every way to skip optional
+    elements and repeat repeated ones.
+    """
+    if not predicates:
+        return not items
+    first = predicates[0]
+    if first is not boundary and requires(first, optional):
+        if full(items, predicates[1:]):
+            return True
+    if items and matches(first, items[0]):
+        if full(items[1:], predicates[1:]):
+            return True
+        if first is not boundary and requires(first, repeat):
+            return full(items[1:], predicates)
+    return False
+
+
+def reference(rule: Rule, segments: list[Segment]) -> list[Segment]:
+    items = [boundary, *segments, boundary]
+    output = []
+    for index, segment in enumerate(segments, 1):
+        matched = (
+            matches(rule.target, segment)
+            and any(
+                full(items[start:index], rule.before) for start in range(index + 1)
+            )
+            and any(
+                full(items[index + 1 : end], rule.after)
+                for end in range(index + 1, len(items) + 1)
+            )
+        )
+        if not matched:
+            output.append(segment)
+        elif rule.replacement is not None:
+            output += rule.replacement
+        else:
+            output.append(
+                Segment(segment.ipa_symbol, (segment.mask | rule.add) & ~rule.remove)
+            )
+    return output
+
+
+RULES = [
+    Rule(consonantal, [voiced]),
+    Rule(-syllabic, [voiced], [syllabic], [syllabic]),
+    Rule(consonantal, None, [], [boundary]),
+    Rule(select("s"), [find("z")], [boundary], [consonantal]),
+    Rule(syllabic, [-voiced], [consonantal & optional], [boundary]),
+    Rule(syllabic, [find("i"), find("a")], [consonantal & repeat, syllabic]),
+    Rule(
+        consonantal,
+        [voiced],
+        [syllabic, consonantal & optional & repeat],
+        [consonantal & optional, syllabic],
+    ),
+    Rule(select("n"), [find("m")], [], [-syllabic & repeat, boundary]),
+    Rule(select("t"), None, [boundary, consonantal & optional, syllabic], []),
+]
+
+
+def test_rule_matches_reference():
+    rng = random.Random(0)
+    words = []
+    for _ in range(300):
+        segments = [rng.choice(SEGMENTS) for _ in range(rng.randint(1, 8))]
+        segments[rng.randrange(len(segments))] = rng.choice(SEGMENTS[-3:])
+        try:
+            words.append(syllabify(segments, *TEMPLATE))
+        except Exception:
+            continue
+    assert len(words) > 100
+
+    for rule in RULES:
+        changed = 0
+        for word in words:
+            output = rule(word).flatten()
+            expected = reference(rule, word.flatten())
+            assert [s.mask for s in output] == [s.mask for s in expected], (
+                rule,
+                word.render(),
+            )
+            changed += output != word.flatten()
+        assert changed, rule
+
+
+def test_unchanged_word_is_returned():
+    word = syllabify(ipa("p", "a", "t", "a"), *TEMPLATE)
+    assert Rule(select("s"), [voiced])(word) is word
+    assert Rule(select("p"), [voiced], [syllabic])(word) is word
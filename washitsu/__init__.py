@@ -1,10 +1,14 @@
 from __future__ import annotations
+import functools
 import itertools
-import copy
 from dataclasses import dataclass
 import random
+import importlib
 import typing as t
-from pprint import pprint
+import unicodedata
+
+from washitsu import instrument
+from washitsu.cache import LRUCache
 
 __all__ = [
     "Segment",
@@ -13,11 +17,18 @@ __all__ = [
     "Syllable",
     "ipa",
     "each_segment",
+    "context_free",
+    "trigger",
+    "chain",
     "select",
     "find",
     "probability",
     "resyllabify",
     "syllabify_string",
+    "SyllableTemplate",
+    "template",
+    "Tokenizer",
+    "tokenizer",
     "_",
     "bilabial",
     "labiodental",
@@ -63,28 +74,117 @@ __all__ = [
 ]
 
 
-def lists_are_equal(a, b):
-    return all(x in b for x in a) and all(x in a for x in b)
+def subset_amount(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def to_mask(features: t.Iterable[Feature]) -> int:
+    mask = 0
+    for feature in features:
+        mask |= feature.mask
+    return mask
+
 
+def to_features(mask: int) -> list[Feature]:
+    return [feature for feature in FEATURES if feature.mask & mask]
 
-def subset_amount(a, b):
-    amount = 0
-    for item in a:
-        if item not in b:
-            amount += 1
-    for item in b:
-        if item not in a:
-            amount += 1
-    return amount
+
+# Past this many terms a predicate is evaluated as a tree instead of in normal form.
+MAX_TERMS = 64
 
 
 class HigherOrderFunction:
+    """
+    A predicate over a feature mask.
+
+    Predicates built out of `Feature`s with `&`, `|`, `^` and `-` form a tree that
+    is compiled into disjunctive normal form: a list of `(required, forbidden)`
+    mask pairs. Each pair is tested with a single
+    `mask & (required | forbidden) == required` comparison.
+
+    Rules often build a new predicate every time they run, so the tree is walked
+    the first time a predicate is called and only compiled once it is called
+    again. Compiled tests are shared by every predicate with the same structure.
+    """
+
     def __init__(self, callable: t.Any) -> None:
         self.callable = callable
         self.name = callable.__name__
+        self._terms: list[tuple[int, int]] | None | bool = False
+        self._test: t.Callable[[int], bool] | None = None
+        self._structure: t.Hashable | bool = False
+
+    def __call__(self, features: int | list[Feature]):
+        if not isinstance(features, int):
+            # A predicate wrapping an arbitrary callable is given the list as it
+            # is, since the callable may expect one.
+            if self.structure() is None:
+                return self.evaluate(features)
+            features = to_mask(features)
+        test = self._test
+        if test is None:
+            self._test = self._compile_and_call
+            return self.evaluate(features)
+        return test(features)
+
+    def _compile_and_call(self, features: int) -> bool:
+        test = self._test = self.compile()
+        return test(features)
+
+    def structure(self) -> t.Hashable:
+        """
+        A key that is the same for predicates built the same way out of the same
+        features, or None for predicates that wrap an arbitrary callable.
+        """
+        if self._structure is False:
+            self._structure = self._build_structure()
+        return self._structure
+
+    def _build_structure(self) -> t.Hashable:
+        return None
+
+    def evaluate(self, features: int) -> bool:
+        """
+        Walk the predicate tree without compiling it.
+        """
+        return self.callable(features)
 
-    def __call__(self, *args, **kwargs):
-        return self.callable(*args, **kwargs)
+    def terms(self) -> list[tuple[int, int]] | None:
+        """
+        The predicate as `(required, forbidden)` pairs, or `None` if it can not be
+        expressed as masks (an arbitrary callable, or too many terms).
+        """
+        if self._terms is False:
+            key = self.structure()
+            if key is None:
+                self._terms = self._build_terms()
+            elif key in _TERMS:
+                self._terms = _TERMS.get(key)
+            else:
+                self._terms = _TERMS[key] = self._build_terms()
+        return self._terms
+
+    def _build_terms(self) -> list[tuple[int, int]] | None:
+        return None
+
+    def compile(self) -> t.Callable[[int], bool]:
+        key = self.structure()
+        if key is not None:
+            test = _TESTS.get(key)
+            if test is not None:
+                return test
+        terms = self.terms()
+        test = self.evaluate if terms is None else compile_terms(terms)
+        if key is not None and terms is not None:
+            _TESTS[key] = test
+        return test
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_terms"] = False
+        state["_test"] = None
+        state["_structure"] = False
+        return state
 
     def __and__(self, other):
         return all_combinator(self, other)
@@ -102,29 +202,225 @@ class HigherOrderFunction:
         return self
 
 
+# Normal forms and compiled tests, by predicate structure.
+_TERMS = LRUCache("terms", 4096)
+_TESTS = LRUCache("tests", 4096)
+
+
+def _structures(args: t.Iterable[HigherOrderFunction]) -> tuple | None:
+    output = []
+    for arg in args:
+        key = arg.structure()
+        if key is None:
+            return None
+        output.append(key)
+    return tuple(output)
+
+
+def simplify_terms(terms: list[tuple[int, int]]) -> list[tuple[int, int]] | None:
+    """
+    Drop contradictory, duplicate and subsumed terms.
+    """
+    terms = sorted(
+        {(req, forb) for req, forb in terms if not req & forb},
+        key=lambda x: (x[0] | x[1]).bit_count(),
+    )
+    output: list[tuple[int, int]] = []
+    for req, forb in terms:
+        if not any(r & ~req == 0 and f & ~forb == 0 for r, f in output):
+            output.append((req, forb))
+    if len(output) > MAX_TERMS:
+        return None
+    return output
+
+
+def conjoin_terms(
+    left: list[tuple[int, int]], right: list[tuple[int, int]]
+) -> list[tuple[int, int]] | None:
+    if len(left) * len(right) > MAX_TERMS * MAX_TERMS:
+        return None
+    return simplify_terms(
+        [(r1 | r2, f1 | f2) for r1, f1 in left for r2, f2 in right]
+    )
+
+
+def negate_terms(terms: list[tuple[int, int]]) -> list[tuple[int, int]] | None:
+    output: list[tuple[int, int]] | None = [(0, 0)]
+    for req, forb in terms:
+        negated = [(0, f.mask) for f in to_features(req)]
+        negated += [(f.mask, 0) for f in to_features(forb)]
+        output = conjoin_terms(output, negated)
+        if output is None:
+            return None
+    return output
+
+
+def requires(predicate: HigherOrderFunction, feature: Feature) -> bool:
+    """
+    Whether a predicate can only be true of masks that include `feature`.
+    """
+    terms = predicate.terms()
+    return terms is not None and all(req & feature.mask for req, _ in terms)
+
+
+def compile_terms(terms: list[tuple[int, int]]) -> t.Callable[[int], bool]:
+    tests = [(req | forb, req) for req, forb in terms]
+
+    if len(tests) == 0:
+        return lambda x: False
+
+    if len(tests) == 1:
+        mask, req = tests[0]
+        if mask == 0:
+            return lambda x: True
+        return lambda x: x & mask == req
+
+    if len(tests) == 2:
+        (mask_a, req_a), (mask_b, req_b) = tests
+        return lambda x: x & mask_a == req_a or x & mask_b == req_b
+
+    return lambda x: any(x & mask == req for mask, req in tests)
+
+
+class AllOf(HigherOrderFunction):
+    def __init__(self, *argv: HigherOrderFunction) -> None:
+        super().__init__(self.evaluate)
+        self.name = "all"
+        self.args = argv
+
+    def evaluate(self, features: int) -> bool:
+        return all(arg.evaluate(features) for arg in self.args)
+
+    def _build_structure(self):
+        args = _structures(self.args)
+        return None if args is None else ("all", args)
+
+    def _build_terms(self):
+        output: list[tuple[int, int]] | None = [(0, 0)]
+        for arg in self.args:
+            terms = arg.terms()
+            if terms is None:
+                return None
+            output = conjoin_terms(output, terms)
+            if output is None:
+                return None
+        return output
+
+    def __repr__(self):
+        if len(self.args) == 0:
+            return "_"
+        return "(" + " & ".join(map(repr, self.args)) + ")"
+
+
+class AnyOf(HigherOrderFunction):
+    def __init__(self, *argv: HigherOrderFunction) -> None:
+        super().__init__(self.evaluate)
+        self.name = "any"
+        self.args = argv
+
+    def evaluate(self, features: int) -> bool:
+        return any(arg.evaluate(features) for arg in self.args)
+
+    def _build_structure(self):
+        args = _structures(self.args)
+        return None if args is None else ("any", args)
+
+    def _build_terms(self):
+        output: list[tuple[int, int]] = []
+        for arg in self.args:
+            terms = arg.terms()
+            if terms is None:
+                return None
+            output += terms
+        return simplify_terms(output)
+
+    def __repr__(self):
+        return "(" + " | ".join(map(repr, self.args)) + ")"
+
+
+class Xor(HigherOrderFunction):
+    def __init__(self, left: HigherOrderFunction, right: HigherOrderFunction) -> None:
+        super().__init__(self.evaluate)
+        self.name = "xor"
+        self.left = left
+        self.right = right
+
+    def evaluate(self, features: int) -> bool:
+        return self.left.evaluate(features) ^ self.right.evaluate(features)
+
+    def _build_structure(self):
+        args = _structures((self.left, self.right))
+        return None if args is None else ("xor", args)
+
+    def _build_terms(self):
+        return AnyOf(
+            AllOf(self.left, Not(self.right)), AllOf(Not(self.left), self.right)
+        ).terms()
+
+    def __repr__(self):
+        return f"({self.left!r} ^ {self.right!r})"
+
+
+class Not(HigherOrderFunction):
+    def __init__(self, arg: HigherOrderFunction) -> None:
+        super().__init__(self.evaluate)
+        self.name = "not"
+        self.arg = arg
+
+    def evaluate(self, features: int) -> bool:
+        return not self.arg.evaluate(features)
+
+    def _build_structure(self):
+        arg = self.arg.structure()
+        return None if arg is None else ("not", arg)
+
+    def _build_terms(self):
+        terms = self.arg.terms()
+        if terms is None:
+            return None
+        return negate_terms(terms)
+
+    def __repr__(self):
+        return f"-{self.arg!r}"
+
+
 def all_combinator(*argv):
-    return HigherOrderFunction(lambda x: all(arg(x) for arg in argv))
+    args = []
+    for arg in argv:
+        args += arg.args if isinstance(arg, AllOf) else [arg]
+    return AllOf(*args)
 
 
 def any_combinator(*argv):
-    return HigherOrderFunction(lambda x: any(arg(x) for arg in argv))
+    args = []
+    for arg in argv:
+        args += arg.args if isinstance(arg, AnyOf) else [arg]
+    return AnyOf(*args)
 
 
 def xor(left, right):
-    return HigherOrderFunction(lambda x: left(x) ^ right(x))
+    return Xor(left, right)
 
 
 def not_combinator(func):
-    return HigherOrderFunction(lambda x: not func(x))
+    if isinstance(func, Not):
+        return func.arg
+    return Not(func)
+
 
+_ = AllOf()
 
-_ = HigherOrderFunction(lambda _: True)
+
+FEATURES: list[Feature] = []
 
 
 class Feature(HigherOrderFunction):
     def __init__(self, name: str):
         super().__init__(self.has)
         self.name = name
+        self.index = len(FEATURES)
+        self.mask = 1 << self.index
+        FEATURES.append(self)
 
     def __str__(self):
         return self.name
@@ -135,9 +431,40 @@ class Feature(HigherOrderFunction):
     def __eq__(self, other):
         return self.name is other.name
 
-    def has(self, x: list[Feature]):
+    def __hash__(self):
+        return self.index
+
+    def __reduce__(self):
+        return (feature, (self.name,))
+
+    def has(self, x: int | list[Feature]):
+        if isinstance(x, int):
+            return x & self.mask != 0
         return self in x
 
+    def evaluate(self, features: int | list[Feature]) -> bool:
+        try:
+            return features & self.mask != 0
+        except TypeError:
+            # A list of features, from a tree with an arbitrary callable in it.
+            return self in features
+
+    def _build_structure(self):
+        return self.index
+
+    def _build_terms(self):
+        return [(self.mask, 0)]
+
+
+def feature(name: str) -> Feature:
+    """
+    Find a feature by name.
+    """
+    for f in FEATURES:
+        if f.name == name:
+            return f
+    raise Exception(f"Unknown feature: {name}")
+
 
 # Place
 bilabial = Feature("Bilabial")
@@ -187,7 +514,7 @@ optional = Feature("Optional")
 repeat = Feature("Repeat")
 
 all_features = [
-        bilabial,
+    bilabial,
     labiodental,
     alveolar,
     postalveolar,
@@ -228,315 +555,509 @@ all_features = [
     long,
 ]
 
-@dataclass
+ALL_FEATURES = to_mask(all_features)
+
+
+# Every segment that has been created, indexed by `Segment.id`.
+INTERNED: list[Segment] = []
+_interned: dict[tuple[str, int], Segment] = {}
+
+
 class Segment:
+    """
+    A sound. Its features are stored as an integer mask with one bit per `Feature`.
+
+    Segments are immutable and interned: there is exactly one instance for each
+    symbol and feature mask. Segments are equal when their features are, like
+    `Syllable` and `Word`; the symbol only records what a segment was made from.
+    """
+
+    __slots__ = ("ipa_symbol", "mask", "id", "_added", "_removed")
+
     ipa_symbol: str
-    features: list[Feature]
+    mask: int
+    id: int
+
+    def __new__(cls, ipa_symbol: str, features: int | list[Feature]) -> Segment:
+        mask = features if isinstance(features, int) else to_mask(features)
+        key = (ipa_symbol, mask)
+        segment = _interned.get(key)
+        if segment is None:
+            segment = object.__new__(cls)
+            object.__setattr__(segment, "ipa_symbol", ipa_symbol)
+            object.__setattr__(segment, "mask", mask)
+            object.__setattr__(segment, "id", len(INTERNED))
+            object.__setattr__(segment, "_added", {})
+            object.__setattr__(segment, "_removed", {})
+            INTERNED.append(segment)
+            _interned[key] = segment
+        return segment
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Segment is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Segment is immutable")
+
+    def __reduce__(self):
+        # Features are pickled by name, since bits can differ between processes.
+        return (Segment, (self.ipa_symbol, self.features))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    @property
+    def features(self) -> list[Feature]:
+        return to_features(self.mask)
+
+    def __repr__(self):
+        return f"Segment(ipa_symbol={self.ipa_symbol!r}, features={self.features!r})"
 
     def __add__(self, other: Feature):
-        changed = copy.copy(self)
-        if other in self.features:
-            return
-        changed.features = copy.copy(self.features) + [other]
-        return changed
+        if self.mask & other.mask == other.mask:
+            return self
+        try:
+            return self._added[other.mask]
+        except KeyError:
+            changed = Segment(self.ipa_symbol, self.mask | other.mask)
+            self._added[other.mask] = changed
+            return changed
 
     def __sub__(self, other: Feature):
-        changed = copy.copy(self)
-        changed.features = list(
-            filter(lambda x: x is not other, copy.copy(self.features))
-        )
-        return changed
+        if not self.mask & other.mask:
+            return self
+        try:
+            return self._removed[other.mask]
+        except KeyError:
+            changed = Segment(self.ipa_symbol, self.mask & ~other.mask)
+            self._removed[other.mask] = changed
+            return changed
 
     def __eq__(self, other):
-        return (
-            isinstance(self, Segment)
-            and isinstance(other, Segment)
-            and self.ipa_symbol == other.ipa_symbol
-            and lists_are_equal(self.features, other.features)
-        )
+        if self is other:
+            return True
+        if not isinstance(other, Segment):
+            return NotImplemented
+        return self.mask == other.mask
+
+    def __hash__(self):
+        return hash(self.mask)
 
     def has(self, feautres):
-        return feautres(self.features)
-
-
-SEGMENTS = [
-    Segment("p", [consonantal, bilabial, stop]),
-    Segment("b", [consonantal, bilabial, stop, voiced]),
-    Segment("t", [consonantal, alveolar, stop]),
-    Segment("d", [consonantal, alveolar, stop, voiced]),
-    Segment("ʈ", [consonantal, retroflex, stop]),
-    Segment("ɖ", [consonantal, retroflex, stop, voiced]),
-    Segment("c", [consonantal, palatal, stop]),
-    Segment("ɟ", [consonantal, palatal, stop, voiced]),
-    Segment("k", [consonantal, velar, stop]),
-    Segment("g", [consonantal, velar, stop, voiced]),
-    Segment("q", [consonantal, uvular, stop]),
-    Segment("ɢ", [consonantal, uvular, stop, voiced]),
-    Segment("ʔ", [glottal, uvular, stop]),
-    Segment("t͡s", [consonantal, alveolar, stop, delayed_release]),
-    Segment("d͡z", [consonantal, alveolar, stop, voiced, delayed_release]),
-    Segment("t͡ʃ", [consonantal, postalveolar, stop, delayed_release]),
-    Segment("d͡ʒ", [consonantal, postalveolar, stop, voiced, delayed_release]),
-    Segment("t͡ɕ", [consonantal, alveolar, palatal, stop, delayed_release]),
-    Segment(
-        "d͡ʑ",
-        [consonantal, alveolar, palatal, stop, voiced, delayed_release],
-    ),
-    Segment("ʈ͡ʂ", [consonantal, retroflex, stop, delayed_release]),
-    Segment("ɖ͡ʐ", [consonantal, retroflex, stop, voiced, delayed_release]),
-    Segment(
-        "t͡ɬ",
-        [consonantal, alveolar, palatal, stop, lateral, delayed_release],
-    ),
-    Segment(
-        "d͡ɮ",
-        [consonantal, alveolar, palatal, stop, voiced, lateral, delayed_release],
-    ),
-    Segment("m̥", [consonantal, bilabial, stop, sonorant, nasal]),
-    Segment("ɱ̊", [consonantal, labiodental, stop, sonorant, nasal]),
-    Segment("n̥", [consonantal, alveolar, stop, sonorant, nasal]),
-    Segment("ɳ̊", [consonantal, retroflex, stop, sonorant, nasal]),
-    Segment("ɲ̊", [consonantal, palatal, stop, sonorant, nasal]),
-    Segment("ŋ̊", [consonantal, velar, stop, sonorant, nasal]),
-    Segment("ɴ̥", [consonantal, uvular, stop, sonorant, nasal]),
-    Segment("m", [consonantal, bilabial, stop, sonorant, nasal, voiced]),
-    Segment("ɱ", [consonantal, labiodental, stop, sonorant, nasal, voiced]),
-    Segment("n", [consonantal, alveolar, stop, sonorant, nasal, voiced]),
-    Segment("ɳ", [consonantal, retroflex, stop, sonorant, nasal, voiced]),
-    Segment("ɲ", [consonantal, palatal, stop, sonorant, nasal, voiced]),
-    Segment("ŋ", [consonantal, velar, stop, sonorant, nasal, voiced]),
-    Segment("ɴ", [consonantal, uvular, stop, sonorant, nasal, voiced]),
-    Segment("̥ʙ", [consonantal, bilabial, sonorant, continuant, trill]),
-    Segment("̥r", [consonantal, alveolar, sonorant, continuant, trill]),
-    Segment("̥ʀ", [consonantal, uvular, sonorant, continuant, trill]),
-    Segment("̥ⱱ", [consonantal, labiodental, sonorant, continuant, tap]),
-    Segment("̥ɾ", [consonantal, alveolar, sonorant, tap]),
-    Segment("̊ɽ", [consonantal, retroflex, sonorant, tap]),
-    Segment("ʙ", [consonantal, bilabial, sonorant, continuant, trill, voiced]),
-    Segment("r", [consonantal, alveolar, sonorant, continuant, trill, voiced]),
-    Segment("ʀ", [consonantal, uvular, sonorant, continuant, trill, voiced]),
-    Segment("ⱱ", [consonantal, labiodental, sonorant, continuant, tap, voiced]),
-    Segment("ɾ", [consonantal, alveolar, sonorant, tap, voiced]),
-    Segment("ɽ", [consonantal, retroflex, sonorant, tap, voiced]),
-    Segment("ɸ", [consonantal, continuant, bilabial, strident]),
-    Segment("β", [consonantal, continuant, bilabial, strident, voiced]),
-    Segment("f", [consonantal, continuant, labiodental, strident]),
-    Segment("v", [consonantal, continuant, labiodental, strident, voiced]),
-    Segment("θ", [consonantal, continuant, alveolar, strident]),
-    Segment("ð", [consonantal, continuant, alveolar, strident, voiced]),
-    Segment("s", [consonantal, continuant, alveolar, strident, sibilant]),
-    Segment("z", [consonantal, continuant, alveolar, strident, sibilant, voiced]),
-    Segment("ɬ", [consonantal, continuant, alveolar, strident, lateral]),
-    Segment("ɮ", [consonantal, continuant, alveolar, strident, lateral, voiced]),
-    Segment("ʃ", [consonantal, continuant, postalveolar, strident, sibilant]),
-    Segment(
-        "ʒ",
-        [consonantal, continuant, postalveolar, strident, sibilant, voiced],
-    ),
-    Segment("ʂ", [consonantal, continuant, retroflex, strident, sibilant]),
-    Segment(
-        "ʐ",
-        [consonantal, continuant, retroflex, strident, sibilant, voiced],
-    ),
-    Segment("ç", [consonantal, continuant, palatal, strident]),
-    Segment("ʝ", [consonantal, continuant, palatal, strident, voiced]),
-    Segment(
-        "ɕ",
-        [consonantal, continuant, alveolar, palatal, strident, sibilant],
-    ),
-    Segment(
-        "ʑ",
-        [consonantal, continuant, alveolar, palatal, strident, sibilant, voiced],
-    ),
-    Segment("x", [consonantal, continuant, velar, strident]),
-    Segment("ɣ", [consonantal, continuant, velar, strident, voiced]),
-    Segment("χ", [consonantal, continuant, uvular, strident]),
-    Segment("ʁ", [consonantal, continuant, uvular, strident, voiced]),
-    Segment("ħ", [consonantal, continuant, pharyngeal, strident]),
-    Segment("ʕ", [consonantal, continuant, pharyngeal, strident, voiced]),
-    Segment("h", [continuant, glottal, strident]),
-    Segment("ɦ", [continuant, glottal, strident, voiced]),
-    Segment("ʋ̥", [consonantal, continuant, sonorant, labiodental]),
-    Segment("ɹ̥", [consonantal, continuant, sonorant, postalveolar]),
-    Segment("ɻ̊", [consonantal, continuant, sonorant, retroflex]),
-    Segment("ɰ̊", [continuant, sonorant, velar]),
-    Segment("j̊", [continuant, sonorant, palatal]),
-    Segment("ɥ̊", [continuant, sonorant, palatal, labialized]),
-    Segment("ʍ", [continuant, sonorant, velar, labialized]),
-    Segment("ʋ", [consonantal, continuant, sonorant, labiodental, voiced]),
-    Segment("ɹ", [consonantal, continuant, sonorant, postalveolar, voiced]),
-    Segment("ɻ", [consonantal, continuant, sonorant, retroflex, voiced]),
-    Segment("ɰ", [continuant, sonorant, velar, voiced]),
-    Segment("j", [continuant, sonorant, palatal, voiced]),
-    Segment("ɥ", [continuant, sonorant, palatal, labialized, voiced]),
-    Segment("w", [continuant, sonorant, velar, labialized, voiced]),
-    Segment("l̥", [consonantal, continuant, sonorant, alveolar, lateral]),
-    Segment("ɭ̊", [consonantal, continuant, sonorant, alveolar, lateral]),
-    Segment("ʎ̥", [consonantal, continuant, sonorant, alveolar, lateral]),
-    Segment("ʟ̥", [consonantal, continuant, sonorant, alveolar, lateral]),
-    Segment("l", [consonantal, continuant, sonorant, alveolar, lateral, voiced]),
-    Segment("ɭ", [consonantal, continuant, sonorant, alveolar, lateral, voiced]),
-    Segment("ʎ", [consonantal, continuant, sonorant, alveolar, lateral, voiced]),
-    Segment("ʟ", [consonantal, continuant, sonorant, alveolar, lateral, voiced]),
-    # Vowels
-    Segment("i̥", [syllabic, sonorant, front, close]),
-    Segment("y̥", [syllabic, sonorant, front, labialized, close]),
-    Segment("ɨ̥", [syllabic, sonorant, central, close]),
-    Segment("ʉ̥", [syllabic, sonorant, central, labialized, close]),
-    Segment("ɯ̥", [syllabic, sonorant, back, close]),
-    Segment("u̥", [syllabic, sonorant, back, labialized, close]),
-    Segment("ɪ̥", [syllabic, sonorant, front, near_close]),
-    Segment("ʏ̥", [syllabic, sonorant, front, labialized, near_close]),
-    Segment("ʊ̥", [syllabic, sonorant, back, labialized, near_close]),
-    Segment("e̥", [syllabic, sonorant, front, close_mid]),
-    Segment("ø̥", [syllabic, sonorant, front, labialized, close_mid]),
-    Segment("ɘ̥", [syllabic, sonorant, central, close_mid]),
-    Segment("ɵ̥", [syllabic, sonorant, central, labialized, close_mid]),
-    Segment("ɤ̥", [syllabic, sonorant, back, close_mid]),
-    Segment("o̥", [syllabic, sonorant, back, labialized, close_mid]),
-    Segment("e̞̥", [syllabic, sonorant, front, mid]),
-    Segment("ø̞̥", [syllabic, sonorant, front, labialized, mid]),
-    Segment("ə̥", [syllabic, sonorant, central, mid]),
-    Segment("ɤ̞̥", [syllabic, sonorant, back, mid]),
-    Segment("o̞̥", [syllabic, sonorant, back, labialized, mid]),
-    Segment("ɛ̥", [syllabic, sonorant, front, open_mid]),
-    Segment("œ̥", [syllabic, sonorant, front, labialized, open_mid]),
-    Segment("ɜ̥", [syllabic, sonorant, central, open_mid]),
-    Segment("ɞ̥", [syllabic, sonorant, central, labialized, open_mid]),
-    Segment("ʌ̥", [syllabic, sonorant, back, open_mid]),
-    Segment("ɔ̥", [syllabic, sonorant, back, labialized, open_mid]),
-    Segment("æ̥", [syllabic, sonorant, front, near_open]),
-    Segment("ɐ̥", [syllabic, sonorant, central, near_open]),
-    Segment("ḁ", [syllabic, sonorant, front, open]),
-    Segment("ɶ̥", [syllabic, sonorant, front, labialized, open]),
-    Segment("ḁ̈", [syllabic, sonorant, central, open]),
-    Segment("ɑ̥", [syllabic, sonorant, back, open]),
-    Segment("ɒ̥", [syllabic, sonorant, back, labialized, open]),
-    Segment("y̥̑", [sonorant, front, labialized, close]),
-    Segment("ɨ̯̥", [sonorant, central, close]),
-    Segment("ʉ̯̥", [sonorant, central, labialized, close]),
-    Segment("ɯ̯̥", [sonorant, back, close]),
-    Segment("u̯̥", [sonorant, back, labialized, close]),
-    Segment("ɪ̯̥", [sonorant, front, near_close]),
-    Segment("ʏ̯̥", [sonorant, front, labialized, near_close]),
-    Segment("ʊ̯̥", [sonorant, back, labialized, near_close]),
-    Segment("e̯̥", [sonorant, front, close_mid]),
-    Segment("ø̯̥", [sonorant, front, labialized, close_mid]),
-    Segment("ɘ̯̥", [sonorant, central, close_mid]),
-    Segment("ɵ̯̥", [sonorant, central, labialized, close_mid]),
-    Segment("ɤ̯̥", [sonorant, back, close_mid]),
-    Segment("o̯̥", [sonorant, back, labialized, close_mid]),
-    Segment("i̯̥", [sonorant, front, close]),
-    Segment("ȇ̞̥", [sonorant, front, mid]),
-    Segment("ø̞̥̑", [sonorant, front, labialized, mid]),
-    Segment("ə̯̥", [sonorant, central, mid]),
-    Segment("ɤ̞̥̑", [sonorant, back, mid]),
-    Segment("ȏ̞̥", [sonorant, back, labialized, mid]),
-    Segment("ɛ̯̥", [sonorant, front, open_mid]),
-    Segment("œ̯̥", [sonorant, front, labialized, open_mid]),
-    Segment("ɜ̯̥", [sonorant, central, open_mid]),
-    Segment("ɞ̯̥", [sonorant, central, labialized, open_mid]),
-    Segment("ʌ̯̥", [sonorant, back, open_mid]),
-    Segment("ɔ̯̥", [sonorant, back, labialized, open_mid]),
-    Segment("æ̯̥", [sonorant, front, near_open]),
-    Segment("ɐ̯̥", [sonorant, central, near_open]),
-    Segment("a̯̥", [sonorant, front, open]),
-    Segment("ɶ̯̥", [sonorant, front, labialized, open]),
-    Segment("ä̯̥", [sonorant, central, open]),
-    Segment("ɑ̯̥", [sonorant, back, open]),
-    Segment("ɒ̯̥", [sonorant, back, labialized, open]),
-    Segment("i", [syllabic, voiced, sonorant, front, close]),
-    Segment("y", [syllabic, voiced, sonorant, front, labialized, close]),
-    Segment("ɨ", [syllabic, voiced, sonorant, central, close]),
-    Segment("ʉ", [syllabic, voiced, sonorant, central, labialized, close]),
-    Segment("ɯ", [syllabic, voiced, sonorant, back, close]),
-    Segment("u", [syllabic, voiced, sonorant, back, labialized, close]),
-    Segment("ɪ", [syllabic, voiced, sonorant, front, near_close]),
-    Segment("ʏ", [syllabic, voiced, sonorant, front, labialized, near_close]),
-    Segment("ʊ", [syllabic, voiced, sonorant, back, labialized, near_close]),
-    Segment("e", [syllabic, voiced, sonorant, front, close_mid]),
-    Segment("ø", [syllabic, voiced, sonorant, front, labialized, close_mid]),
-    Segment("ɘ", [syllabic, voiced, sonorant, central, close_mid]),
-    Segment("ɵ", [syllabic, voiced, sonorant, central, labialized, close_mid]),
-    Segment("ɤ", [syllabic, voiced, sonorant, back, close_mid]),
-    Segment("o", [syllabic, voiced, sonorant, back, labialized, close_mid]),
-    Segment("e̞", [syllabic, voiced, sonorant, front, mid]),
-    Segment("ø̞", [syllabic, voiced, sonorant, front, labialized, mid]),
-    Segment("ə", [syllabic, voiced, sonorant, central, mid]),
-    Segment("ɤ̞", [syllabic, voiced, sonorant, back, mid]),
-    Segment("o̞", [syllabic, voiced, sonorant, back, labialized, mid]),
-    Segment("ɛ", [syllabic, voiced, sonorant, front, open_mid]),
-    Segment("œ", [syllabic, voiced, sonorant, front, labialized, open_mid]),
-    Segment("ɜ", [syllabic, voiced, sonorant, central, open_mid]),
-    Segment("ɞ", [syllabic, voiced, sonorant, central, labialized, open_mid]),
-    Segment("ʌ", [syllabic, voiced, sonorant, back, open_mid]),
-    Segment("ɔ", [syllabic, voiced, sonorant, back, labialized, open_mid]),
-    Segment("æ", [syllabic, voiced, sonorant, front, near_open]),
-    Segment("ɐ", [syllabic, voiced, sonorant, central, near_open]),
-    Segment("a", [syllabic, voiced, sonorant, front, open]),
-    Segment("ɶ", [syllabic, voiced, sonorant, front, labialized, open]),
-    Segment("ä", [syllabic, voiced, sonorant, central, open]),
-    Segment("ɑ", [syllabic, voiced, sonorant, back, open]),
-    Segment("ɒ", [syllabic, voiced, sonorant, back, labialized, open]),
-    Segment("i̯", [voiced, sonorant, front, close]),
-    Segment("y̑", [voiced, sonorant, front, labialized, close]),
-    Segment("ɨ̯", [voiced, sonorant, central, close]),
-    Segment("ʉ̯", [voiced, sonorant, central, labialized, close]),
-    Segment("ɯ̯", [voiced, sonorant, back, close]),
-    Segment("u̯", [voiced, sonorant, back, labialized, close]),
-    Segment("ɪ̯", [voiced, sonorant, front, near_close]),
-    Segment("ʏ̯", [voiced, sonorant, front, labialized, near_close]),
-    Segment("ʊ̯", [voiced, sonorant, back, labialized, near_close]),
-    Segment("e̯", [voiced, sonorant, front, close_mid]),
-    Segment("ø̯", [voiced, sonorant, front, labialized, close_mid]),
-    Segment("ɘ̯", [voiced, sonorant, central, close_mid]),
-    Segment("ɵ̯", [voiced, sonorant, central, labialized, close_mid]),
-    Segment("ɤ̯", [voiced, sonorant, back, close_mid]),
-    Segment("o̯", [voiced, sonorant, back, labialized, close_mid]),
-    Segment("ȇ̞", [voiced, sonorant, front, mid]),
-    Segment("ø̞̑", [voiced, sonorant, front, labialized, mid]),
-    Segment("ə̯", [voiced, sonorant, central, mid]),
-    Segment("ɤ̞̑", [voiced, sonorant, back, mid]),
-    Segment("ȏ̞", [voiced, sonorant, back, labialized, mid]),
-    Segment("ɛ̯", [voiced, sonorant, front, open_mid]),
-    Segment("œ̯", [voiced, sonorant, front, labialized, open_mid]),
-    Segment("ɜ̯", [voiced, sonorant, central, open_mid]),
-    Segment("ɞ̯", [voiced, sonorant, central, labialized, open_mid]),
-    Segment("ʌ̯", [voiced, sonorant, back, open_mid]),
-    Segment("ɔ̯", [voiced, sonorant, back, labialized, open_mid]),
-    Segment("æ̯", [voiced, sonorant, front, near_open]),
-    Segment("ɐ̯", [voiced, sonorant, central, near_open]),
-    Segment("a̯", [voiced, sonorant, front, open]),
-    Segment("ɶ̯", [voiced, sonorant, front, labialized, open]),
-    Segment("ä̯", [voiced, sonorant, central, open]),
-    Segment("ɑ̯", [voiced, sonorant, back, open]),
-    Segment("ɒ̯", [voiced, sonorant, back, labialized, open]),
-]
+        return feautres(self.mask)
+
+
+@functools.cache
+def _segments() -> list[Segment]:
+    """
+    The segment inventory, built the first time it is needed.
+    """
+    return [
+        Segment("p", [consonantal, bilabial, stop]),
+        Segment("b", [consonantal, bilabial, stop, voiced]),
+        Segment("t", [consonantal, alveolar, stop]),
+        Segment("d", [consonantal, alveolar, stop, voiced]),
+        Segment("ʈ", [consonantal, retroflex, stop]),
+        Segment("ɖ", [consonantal, retroflex, stop, voiced]),
+        Segment("c", [consonantal, palatal, stop]),
+        Segment("ɟ", [consonantal, palatal, stop, voiced]),
+        Segment("k", [consonantal, velar, stop]),
+        Segment("g", [consonantal, velar, stop, voiced]),
+        Segment("q", [consonantal, uvular, stop]),
+        Segment("ɢ", [consonantal, uvular, stop, voiced]),
+        Segment("ʔ", [glottal, uvular, stop]),
+        Segment("t͡s", [consonantal, alveolar, stop, delayed_release]),
+        Segment("d͡z", [consonantal, alveolar, stop, voiced, delayed_release]),
+        Segment("t͡ʃ", [consonantal, postalveolar, stop, delayed_release]),
+        Segment("d͡ʒ", [consonantal, postalveolar, stop, voiced, delayed_release]),
+        Segment("t͡ɕ", [consonantal, alveolar, palatal, stop, delayed_release]),
+        Segment(
+            "d͡ʑ",
+            [consonantal, alveolar, palatal, stop, voiced, delayed_release],
+        ),
+        Segment("ʈ͡ʂ", [consonantal, retroflex, stop, delayed_release]),
+        Segment("ɖ͡ʐ", [consonantal, retroflex, stop, voiced, delayed_release]),
+        Segment(
+            "t͡ɬ",
+            [consonantal, alveolar, palatal, stop, lateral, delayed_release],
+        ),
+        Segment(
+            "d͡ɮ",
+            [consonantal, alveolar, palatal, stop, voiced, lateral, delayed_release],
+        ),
+        Segment("m̥", [consonantal, bilabial, stop, sonorant, nasal]),
+        Segment("ɱ̊", [consonantal, labiodental, stop, sonorant, nasal]),
+        Segment("n̥", [consonantal, alveolar, stop, sonorant, nasal]),
+        Segment("ɳ̊", [consonantal, retroflex, stop, sonorant, nasal]),
+        Segment("ɲ̊", [consonantal, palatal, stop, sonorant, nasal]),
+        Segment("ŋ̊", [consonantal, velar, stop, sonorant, nasal]),
+        Segment("ɴ̥", [consonantal, uvular, stop, sonorant, nasal]),
+        Segment("m", [consonantal, bilabial, stop, sonorant, nasal, voiced]),
+        Segment("ɱ", [consonantal, labiodental, stop, sonorant, nasal, voiced]),
+        Segment("n", [consonantal, alveolar, stop, sonorant, nasal, voiced]),
+        Segment("ɳ", [consonantal, retroflex, stop, sonorant, nasal, voiced]),
+        Segment("ɲ", [consonantal, palatal, stop, sonorant, nasal, voiced]),
+        Segment("ŋ", [consonantal, velar, stop, sonorant, nasal, voiced]),
+        Segment("ɴ", [consonantal, uvular, stop, sonorant, nasal, voiced]),
+        Segment("̥ʙ", [consonantal, bilabial, sonorant, continuant, trill]),
+        Segment("̥r", [consonantal, alveolar, sonorant, continuant, trill]),
+        Segment("̥ʀ", [consonantal, uvular, sonorant, continuant, trill]),
+        Segment("̥ⱱ", [consonantal, labiodental, sonorant, continuant, tap]),
+        Segment("̥ɾ", [consonantal, alveolar, sonorant, tap]),
+        Segment("̊ɽ", [consonantal, retroflex, sonorant, tap]),
+        Segment("ʙ", [consonantal, bilabial, sonorant, continuant, trill, voiced]),
+        Segment("r", [consonantal, alveolar, sonorant, continuant, trill, voiced]),
+        Segment("ʀ", [consonantal, uvular, sonorant, continuant, trill, voiced]),
+        Segment("ⱱ", [consonantal, labiodental, sonorant, continuant, tap, voiced]),
+        Segment("ɾ", [consonantal, alveolar, sonorant, tap, voiced]),
+        Segment("ɽ", [consonantal, retroflex, sonorant, tap, voiced]),
+        Segment("ɸ", [consonantal, continuant, bilabial, strident]),
+        Segment("β", [consonantal, continuant, bilabial, strident, voiced]),
+        Segment("f", [consonantal, continuant, labiodental, strident]),
+        Segment("v", [consonantal, continuant, labiodental, strident, voiced]),
+        Segment("θ", [consonantal, continuant, alveolar, strident]),
+        Segment("ð", [consonantal, continuant, alveolar, strident, voiced]),
+        Segment("s", [consonantal, continuant, alveolar, strident, sibilant]),
+        Segment("z", [consonantal, continuant, alveolar, strident, sibilant, voiced]),
+        Segment("ɬ", [consonantal, continuant, alveolar, strident, lateral]),
+        Segment("ɮ", [consonantal, continuant, alveolar, strident, lateral, voiced]),
+        Segment("ʃ", [consonantal, continuant, postalveolar, strident, sibilant]),
+        Segment(
+            "ʒ",
+            [consonantal, continuant, postalveolar, strident, sibilant, voiced],
+        ),
+        Segment("ʂ", [consonantal, continuant, retroflex, strident, sibilant]),
+        Segment(
+            "ʐ",
+            [consonantal, continuant, retroflex, strident, sibilant, voiced],
+        ),
+        Segment("ç", [consonantal, continuant, palatal, strident]),
+        Segment("ʝ", [consonantal, continuant, palatal, strident, voiced]),
+        Segment(
+            "ɕ",
+            [consonantal, continuant, alveolar, palatal, strident, sibilant],
+        ),
+        Segment(
+            "ʑ",
+            [consonantal, continuant, alveolar, palatal, strident, sibilant, voiced],
+        ),
+        Segment("x", [consonantal, continuant, velar, strident]),
+        Segment("ɣ", [consonantal, continuant, velar, strident, voiced]),
+        Segment("χ", [consonantal, continuant, uvular, strident]),
+        Segment("ʁ", [consonantal, continuant, uvular, strident, voiced]),
+        Segment("ħ", [consonantal, continuant, pharyngeal, strident]),
+        Segment("ʕ", [consonantal, continuant, pharyngeal, strident, voiced]),
+        Segment("h", [continuant, glottal, strident]),
+        Segment("ɦ", [continuant, glottal, strident, voiced]),
+        Segment("ʋ̥", [consonantal, continuant, sonorant, labiodental]),
+        Segment("ɹ̥", [consonantal, continuant, sonorant, postalveolar]),
+        Segment("ɻ̊", [consonantal, continuant, sonorant, retroflex]),
+        Segment("ɰ̊", [continuant, sonorant, velar]),
+        Segment("j̊", [continuant, sonorant, palatal]),
+        Segment("ɥ̊", [continuant, sonorant, palatal, labialized]),
+        Segment("ʍ", [continuant, sonorant, velar, labialized]),
+        Segment("ʋ", [consonantal, continuant, sonorant, labiodental, voiced]),
+        Segment("ɹ", [consonantal, continuant, sonorant, postalveolar, voiced]),
+        Segment("ɻ", [consonantal, continuant, sonorant, retroflex, voiced]),
+        Segment("ɰ", [continuant, sonorant, velar, voiced]),
+        Segment("j", [continuant, sonorant, palatal, voiced]),
+        Segment("ɥ", [continuant, sonorant, palatal, labialized, voiced]),
+        Segment("w", [continuant, sonorant, velar, labialized, voiced]),
+        Segment("l̥", [consonantal, continuant, sonorant, alveolar, lateral]),
+        Segment("ɭ̊", [consonantal, continuant, sonorant, alveolar, lateral]),
+        Segment("ʎ̥", [consonantal, continuant, sonorant, alveolar, lateral]),
+        Segment("ʟ̥", [consonantal, continuant, sonorant, alveolar, lateral]),
+        Segment("l", [consonantal, continuant, sonorant, alveolar, lateral, voiced]),
+        Segment("ɭ", [consonantal, continuant, sonorant, alveolar, lateral, voiced]),
+        Segment("ʎ", [consonantal, continuant, sonorant, alveolar, lateral, voiced]),
+        Segment("ʟ", [consonantal, continuant, sonorant, alveolar, lateral, voiced]),
+        # Vowels
+        Segment("i̥", [syllabic, sonorant, front, close]),
+        Segment("y̥", [syllabic, sonorant, front, labialized, close]),
+        Segment("ɨ̥", [syllabic, sonorant, central, close]),
+        Segment("ʉ̥", [syllabic, sonorant, central, labialized, close]),
+        Segment("ɯ̥", [syllabic, sonorant, back, close]),
+        Segment("u̥", [syllabic, sonorant, back, labialized, close]),
+        Segment("ɪ̥", [syllabic, sonorant, front, near_close]),
+        Segment("ʏ̥", [syllabic, sonorant, front, labialized, near_close]),
+        Segment("ʊ̥", [syllabic, sonorant, back, labialized, near_close]),
+        Segment("e̥", [syllabic, sonorant, front, close_mid]),
+        Segment("ø̥", [syllabic, sonorant, front, labialized, close_mid]),
+        Segment("ɘ̥", [syllabic, sonorant, central, close_mid]),
+        Segment("ɵ̥", [syllabic, sonorant, central, labialized, close_mid]),
+        Segment("ɤ̥", [syllabic, sonorant, back, close_mid]),
+        Segment("o̥", [syllabic, sonorant, back, labialized, close_mid]),
+        Segment("e̞̥", [syllabic, sonorant, front, mid]),
+        Segment("ø̞̥", [syllabic, sonorant, front, labialized, mid]),
+        Segment("ə̥", [syllabic, sonorant, central, mid]),
+        Segment("ɤ̞̥", [syllabic, sonorant, back, mid]),
+        Segment("o̞̥", [syllabic, sonorant, back, labialized, mid]),
+        Segment("ɛ̥", [syllabic, sonorant, front, open_mid]),
+        Segment("œ̥", [syllabic, sonorant, front, labialized, open_mid]),
+        Segment("ɜ̥", [syllabic, sonorant, central, open_mid]),
+        Segment("ɞ̥", [syllabic, sonorant, central, labialized, open_mid]),
+        Segment("ʌ̥", [syllabic, sonorant, back, open_mid]),
+        Segment("ɔ̥", [syllabic, sonorant, back, labialized, open_mid]),
+        Segment("æ̥", [syllabic, sonorant, front, near_open]),
+        Segment("ɐ̥", [syllabic, sonorant, central, near_open]),
+        Segment("ḁ", [syllabic, sonorant, front, open]),
+        Segment("ɶ̥", [syllabic, sonorant, front, labialized, open]),
+        Segment("ḁ̈", [syllabic, sonorant, central, open]),
+        Segment("ɑ̥", [syllabic, sonorant, back, open]),
+        Segment("ɒ̥", [syllabic, sonorant, back, labialized, open]),
+        Segment("y̥̑", [sonorant, front, labialized, close]),
+        Segment("ɨ̯̥", [sonorant, central, close]),
+        Segment("ʉ̯̥", [sonorant, central, labialized, close]),
+        Segment("ɯ̯̥", [sonorant, back, close]),
+        Segment("u̯̥", [sonorant, back, labialized, close]),
+        Segment("ɪ̯̥", [sonorant, front, near_close]),
+        Segment("ʏ̯̥", [sonorant, front, labialized, near_close]),
+        Segment("ʊ̯̥", [sonorant, back, labialized, near_close]),
+        Segment("e̯̥", [sonorant, front, close_mid]),
+        Segment("ø̯̥", [sonorant, front, labialized, close_mid]),
+        Segment("ɘ̯̥", [sonorant, central, close_mid]),
+        Segment("ɵ̯̥", [sonorant, central, labialized, close_mid]),
+        Segment("ɤ̯̥", [sonorant, back, close_mid]),
+        Segment("o̯̥", [sonorant, back, labialized, close_mid]),
+        Segment("i̯̥", [sonorant, front, close]),
+        Segment("ȇ̞̥", [sonorant, front, mid]),
+        Segment("ø̞̥̑", [sonorant, front, labialized, mid]),
+        Segment("ə̯̥", [sonorant, central, mid]),
+        Segment("ɤ̞̥̑", [sonorant, back, mid]),
+        Segment("ȏ̞̥", [sonorant, back, labialized, mid]),
+        Segment("ɛ̯̥", [sonorant, front, open_mid]),
+        Segment("œ̯̥", [sonorant, front, labialized, open_mid]),
+        Segment("ɜ̯̥", [sonorant, central, open_mid]),
+        Segment("ɞ̯̥", [sonorant, central, labialized, open_mid]),
+        Segment("ʌ̯̥", [sonorant, back, open_mid]),
+        Segment("ɔ̯̥", [sonorant, back, labialized, open_mid]),
+        Segment("æ̯̥", [sonorant, front, near_open]),
+        Segment("ɐ̯̥", [sonorant, central, near_open]),
+        Segment("a̯̥", [sonorant, front, open]),
+        Segment("ɶ̯̥", [sonorant, front, labialized, open]),
+        Segment("ä̯̥", [sonorant, central, open]),
+        Segment("ɑ̯̥", [sonorant, back, open]),
+        Segment("ɒ̯̥", [sonorant, back, labialized, open]),
+        Segment("i", [syllabic, voiced, sonorant, front, close]),
+        Segment("y", [syllabic, voiced, sonorant, front, labialized, close]),
+        Segment("ɨ", [syllabic, voiced, sonorant, central, close]),
+        Segment("ʉ", [syllabic, voiced, sonorant, central, labialized, close]),
+        Segment("ɯ", [syllabic, voiced, sonorant, back, close]),
+        Segment("u", [syllabic, voiced, sonorant, back, labialized, close]),
+        Segment("ɪ", [syllabic, voiced, sonorant, front, near_close]),
+        Segment("ʏ", [syllabic, voiced, sonorant, front, labialized, near_close]),
+        Segment("ʊ", [syllabic, voiced, sonorant, back, labialized, near_close]),
+        Segment("e", [syllabic, voiced, sonorant, front, close_mid]),
+        Segment("ø", [syllabic, voiced, sonorant, front, labialized, close_mid]),
+        Segment("ɘ", [syllabic, voiced, sonorant, central, close_mid]),
+        Segment("ɵ", [syllabic, voiced, sonorant, central, labialized, close_mid]),
+        Segment("ɤ", [syllabic, voiced, sonorant, back, close_mid]),
+        Segment("o", [syllabic, voiced, sonorant, back, labialized, close_mid]),
+        Segment("e̞", [syllabic, voiced, sonorant, front, mid]),
+        Segment("ø̞", [syllabic, voiced, sonorant, front, labialized, mid]),
+        Segment("ə", [syllabic, voiced, sonorant, central, mid]),
+        Segment("ɤ̞", [syllabic, voiced, sonorant, back, mid]),
+        Segment("o̞", [syllabic, voiced, sonorant, back, labialized, mid]),
+        Segment("ɛ", [syllabic, voiced, sonorant, front, open_mid]),
+        Segment("œ", [syllabic, voiced, sonorant, front, labialized, open_mid]),
+        Segment("ɜ", [syllabic, voiced, sonorant, central, open_mid]),
+        Segment("ɞ", [syllabic, voiced, sonorant, central, labialized, open_mid]),
+        Segment("ʌ", [syllabic, voiced, sonorant, back, open_mid]),
+        Segment("ɔ", [syllabic, voiced, sonorant, back, labialized, open_mid]),
+        Segment("æ", [syllabic, voiced, sonorant, front, near_open]),
+        Segment("ɐ", [syllabic, voiced, sonorant, central, near_open]),
+        Segment("a", [syllabic, voiced, sonorant, front, open]),
+        Segment("ɶ", [syllabic, voiced, sonorant, front, labialized, open]),
+        Segment("ä", [syllabic, voiced, sonorant, central, open]),
+        Segment("ɑ", [syllabic, voiced, sonorant, back, open]),
+        Segment("ɒ", [syllabic, voiced, sonorant, back, labialized, open]),
+        Segment("i̯", [voiced, sonorant, front, close]),
+        Segment("y̑", [voiced, sonorant, front, labialized, close]),
+        Segment("ɨ̯", [voiced, sonorant, central, close]),
+        Segment("ʉ̯", [voiced, sonorant, central, labialized, close]),
+        Segment("ɯ̯", [voiced, sonorant, back, close]),
+        Segment("u̯", [voiced, sonorant, back, labialized, close]),
+        Segment("ɪ̯", [voiced, sonorant, front, near_close]),
+        Segment("ʏ̯", [voiced, sonorant, front, labialized, near_close]),
+        Segment("ʊ̯", [voiced, sonorant, back, labialized, near_close]),
+        Segment("e̯", [voiced, sonorant, front, close_mid]),
+        Segment("ø̯", [voiced, sonorant, front, labialized, close_mid]),
+        Segment("ɘ̯", [voiced, sonorant, central, close_mid]),
+        Segment("ɵ̯", [voiced, sonorant, central, labialized, close_mid]),
+        Segment("ɤ̯", [voiced, sonorant, back, close_mid]),
+        Segment("o̯", [voiced, sonorant, back, labialized, close_mid]),
+        Segment("ȇ̞", [voiced, sonorant, front, mid]),
+        Segment("ø̞̑", [voiced, sonorant, front, labialized, mid]),
+        Segment("ə̯", [voiced, sonorant, central, mid]),
+        Segment("ɤ̞̑", [voiced, sonorant, back, mid]),
+        Segment("ȏ̞", [voiced, sonorant, back, labialized, mid]),
+        Segment("ɛ̯", [voiced, sonorant, front, open_mid]),
+        Segment("œ̯", [voiced, sonorant, front, labialized, open_mid]),
+        Segment("ɜ̯", [voiced, sonorant, central, open_mid]),
+        Segment("ɞ̯", [voiced, sonorant, central, labialized, open_mid]),
+        Segment("ʌ̯", [voiced, sonorant, back, open_mid]),
+        Segment("ɔ̯", [voiced, sonorant, back, labialized, open_mid]),
+        Segment("æ̯", [voiced, sonorant, front, near_open]),
+        Segment("ɐ̯", [voiced, sonorant, central, near_open]),
+        Segment("a̯", [voiced, sonorant, front, open]),
+        Segment("ɶ̯", [voiced, sonorant, front, labialized, open]),
+        Segment("ä̯", [voiced, sonorant, central, open]),
+        Segment("ɑ̯", [voiced, sonorant, back, open]),
+        Segment("ɒ̯", [voiced, sonorant, back, labialized, open]),
+    ]
+
+
+@functools.cache
+def _diacritics() -> list[Segment]:
+    """
+    Diacritics, as segments with the features they add.
+    """
+    return [
+        Segment("ˠ", [velarized]),
+        Segment("ˤ", [pharyngealized]),
+        Segment("ʷ", [labialized]),
+        Segment("ʲ", [palatalized]),
+        Segment("ʰ", [aspirated]),
+        Segment("̃", [nasal]),
+        Segment("ː", [long]),
+        Segment("R", [repeat]),
+        Segment("O", [optional]),
+    ]
+
+
+def __getattr__(name: str) -> t.Any:
+    # The inventory is only built when it is first used.
+    if name == "SEGMENTS":
+        return _segments()
+    if name == "DIACRITICS":
+        return _diacritics()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def normalize(symbol: str) -> str:
+    """
+    Decompose a symbol so precomposed letters like `ã` match a base segment plus
+    diacritics.
+    """
+    return unicodedata.normalize("NFD", symbol)
+
+
+def _trie(symbols: dict[str, t.Any]) -> dict:
+    root: dict = {}
+    for symbol, value in symbols.items():
+        node = root
+        for char in symbol:
+            node = node.setdefault(char, {})
+        node[""] = value
+    return root
+
+
+def _longest_match(trie: dict, string: str, start: int) -> tuple[t.Any, int]:
+    node = trie
+    value = None
+    end = start
+    for index in range(start, len(string)):
+        node = node.get(string[index])
+        if node is None:
+            break
+        if "" in node:
+            value = node[""]
+            end = index + 1
+    return value, end
+
+
+class Tokenizer:
+    """
+    Splits IPA strings into segments in one pass. Each segment is the longest
+    matching base symbol followed by any number of diacritics.
+    """
+
+    def __init__(self, segments: list[Segment], diacritics: list[Segment]) -> None:
+        self.symbols: dict[str, Segment] = {}
+        for segment in segments:
+            self.symbols.setdefault(normalize(segment.ipa_symbol), segment)
+
+        self.diacritics: dict[str, Segment] = {}
+        for diacritic in diacritics:
+            self.diacritics.setdefault(normalize(diacritic.ipa_symbol), diacritic)
+
+        self._segment_trie = _trie(self.symbols)
+        self._diacritic_trie = _trie(self.diacritics)
+
+    def find(self, symbol: str) -> Segment:
+        try:
+            return self.symbols[normalize(symbol)]
+        except KeyError:
+            raise Exception(f"Can not find segment: {symbol}") from None
+
+    def tokenize(self, string: str) -> list[Segment]:
+        string = normalize(string)
+        output: list[Segment] = []
+
+        index = 0
+        while index < len(string):
+            segment, end = _longest_match(self._segment_trie, string, index)
+            if segment is None:
+                raise Exception(f"Can not find segment: {string[index:]}")
+
+            while end < len(string):
+                diacritic, diacritic_end = _longest_match(
+                    self._diacritic_trie, string, end
+                )
+                if diacritic is None:
+                    break
+                segment = Segment(
+                    segment.ipa_symbol + diacritic.ipa_symbol,
+                    segment.mask | diacritic.mask,
+                )
+                end = diacritic_end
 
-DIACRITICS = [
-    Segment("ˠ", [velarized]),
-    Segment("ˤ", [pharyngealized]),
-    Segment("ʷ", [labialized]),
-    Segment("ʲ", [palatalized]),
-    Segment("ʰ", [aspirated]),
-    Segment("̃", [nasal]),
-    Segment("ː", [long]),
-    Segment("R", [repeat]),
-    Segment("O", [optional]),
-]
+            output.append(segment)
+            index = end
+
+        return output
+
+
+@functools.cache
+def tokenizer() -> Tokenizer:
+    """
+    The tokenizer for the built-in segments and diacritics.
+    """
+    return Tokenizer(_segments(), _diacritics())
 
 
 def ipa(*symbols: list[str]) -> list[Segment]:
     output: list[Segment] = []
     for symbol in symbols:
-        extra_features = []
-        for diacritic in DIACRITICS:
-            if diacritic.ipa_symbol in symbol:
-                extra_features += diacritic.features
-
-        segment = next(filter(lambda s: s.ipa_symbol in symbol, SEGMENTS))
-        new_segment = Segment(symbol, segment.features + extra_features)
-        output.append(new_segment)
+        segments = tokenizer().tokenize(symbol)
+        if len(segments) != 1:
+            raise Exception(f"Expected a single segment: {symbol}")
+        output += segments
+    return output
+
+
+_CANDIDATES = LRUCache("candidates", 1024)
+
+
+def _candidates(
+    segments: list[Segment], predicate: HigherOrderFunction
+) -> list[Segment]:
+    """
+    The segments matching a predicate. Results are kept per inventory list and
+    normal form, so a predicate rebuilt on every call, like `-syllabic`, still
+    finds them.
+    """
+    terms = predicate.terms()
+    key = (id(segments), predicate if terms is None else tuple(terms))
+    cached = _CANDIDATES.get(key)
+    # The list is kept alive by the cache, so its id is not reused while cached.
+    if cached is not None and cached[0] is segments and cached[1] == len(segments):
+        return cached[2]
+    output = [x for x in segments if predicate(x.mask)]
+    _CANDIDATES[key] = (segments, len(segments), output)
     return output
 
 
@@ -554,7 +1075,7 @@ def syllable(
         for segmentsegment in segment:
             if not segmentsegment:
                 continue
-            stuff = list(filter(lambda x: segmentsegment(x.features), segments))
+            stuff = _candidates(segments, segmentsegment)
             outputoutput += [random.choice(stuff)]
 
         output += [outputoutput]
@@ -570,72 +1091,470 @@ class Syllable:
 
     # supersegmentals: list[Feature]
     #
-    def __eq__(self, other):
+    def key(self) -> tuple[tuple[int, ...], tuple[int, ...], tuple[int, ...]]:
+        """
+        The feature masks of the segments in the onset, nucleus and coda, so
+        segments that only differ in the symbol they were made from are the same.
+        Syllables can be changed in place, so it is worked out every time.
+        """
         return (
-            lists_are_equal(self.onset, other.onset)
-            and lists_are_equal(self.nucleus, other.nucleus)
-            and lists_are_equal(self.coda, other.coda)
+            tuple(segment.mask for segment in self.onset),
+            tuple(segment.mask for segment in self.nucleus),
+            tuple(segment.mask for segment in self.coda),
         )
 
+    def __eq__(self, other):
+        if not isinstance(other, Syllable):
+            return NotImplemented
+        return self is other or self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+class Renderer:
+    """
+    Turns feature masks back into IPA: the closest segment in the inventory by
+    number of differing features, plus a diacritic for each feature it lacks.
+    Results are memoized per feature mask.
+    """
+
+    def __init__(
+        self, segments: list[Segment], diacritics: list[Segment], maxsize: int = 4096
+    ) -> None:
+        self.segments = segments
+        self.masks = [segment.mask for segment in segments]
+        self.exact: dict[int, Segment] = {}
+        for segment in segments:
+            self.exact.setdefault(segment.mask, segment)
+        self.diacritics: dict[int, tuple[int, str]] = {}
+        for position, diacritic in enumerate(diacritics):
+            if diacritic.mask.bit_count() == 1:
+                self.diacritics.setdefault(
+                    diacritic.mask, (position, diacritic.ipa_symbol)
+                )
+        self.render = functools.lru_cache(maxsize=maxsize)(self._render)
 
-def _default_word_printer(segment: Segment) -> str:
-    subset_amounts = []
-    for big_seg in SEGMENTS:
-        subset_amounts += [(big_seg, subset_amount(segment.features, big_seg.features))]
+    def nearest(self, mask: int) -> Segment:
+        if mask in self.exact:
+            return self.exact[mask]
+        masks = self.masks
+        index = min(range(len(masks)), key=lambda i: (masks[i] ^ mask).bit_count())
+        return self.segments[index]
 
-    subset_amounts: list[tuple[Segment, int]] = sorted(
-        subset_amounts, key=lambda x: x[1]
-    )
+    def _render(self, mask: int) -> str:
+        chosen_seg = self.nearest(mask)
+        leftover_features = to_features(mask & ~chosen_seg.mask)
 
-    chosen_seg = subset_amounts[0][0]
-    leftover_features = copy.copy(segment.features)
-    for feature in chosen_seg.features:
-        if feature in leftover_features:
-            leftover_features.remove(feature)
+        try:
+            diacritics = sorted(self.diacritics[f.mask] for f in leftover_features)
+        except KeyError:
+            raise Exception(
+                f"Can not find matching segment: {to_features(mask)}"
+            ) from None
 
-    diacritics = ""
+        return chosen_seg.ipa_symbol + "".join(symbol for _, symbol in diacritics)
 
-    for feature in leftover_features:
-        try:
-            diacritics += next(
-                filter(lambda x: x.features == [feature], DIACRITICS)
-            ).ipa_symbol
-        except:
-            raise Exception(f"Can not find matching segment: {segment.features}")
 
-    return subset_amounts[0][0].ipa_symbol + diacritics
+@functools.cache
+def _renderer() -> Renderer:
+    return Renderer(_segments(), _diacritics())
+
 
+def _default_word_printer(segment: Segment) -> str:
+    return _renderer().render(segment.mask)
+
+
+def qualified(module: str, qualname: str) -> t.Any:
+    """
+    Import an object by module and qualified name.
+    """
+    output = importlib.import_module(module)
+    for name in qualname.split("."):
+        output = getattr(output, name)
+    return output
+
+
+def _importable(rule: t.Any) -> bool:
+    try:
+        return qualified(rule.__module__, rule.__qualname__) is rule
+    except (AttributeError, ImportError):
+        return False
 
-def each_segment(f: t.Callable[[Word], Segment | list[Segment]]):
-    def out(word):
+
+class SegmentRule:
+    """
+    A rule made with `each_segment`: `function` is called with the word and each
+    of its segments, and returns the segment or segments that replace it.
+    """
+
+    def __init__(self, function: t.Callable[[Word, Segment], Segment | list[Segment]]):
+        functools.update_wrapper(self, function)
+        self.function = function
+        self.context_free = False
+        self.trigger: HigherOrderFunction | None = None
+
+    def __reduce__(self):
+        # Rules defined with a decorator are found again by name, anything else is
+        # rebuilt from its function.
+        if _importable(self):
+            return (qualified, (self.__module__, self.__qualname__))
+        return (_segment_rule, (self.function, self.context_free, self.trigger))
+
+    def __call__(self, word: Word) -> Word:
+        f = self.function
+        context = Context(word)
         syllables = []
+        changed = False
 
-        def to_list(x):
-            if isinstance(x, list):
-                return x
+        for syllable in word.syllables:
+            parts = []
+            same = True
+            for part in (syllable.onset, syllable.nucleus, syllable.coda):
+                output = []
+                for segment in part:
+                    result = f(context, segment)
+                    if isinstance(result, list):
+                        output += result
+                        same = same and len(result) == 1 and result[0] is segment
+                    else:
+                        output.append(result)
+                        same = same and result is segment
+                    context.index += 1
+                parts.append(output)
+
+            if same:
+                syllables.append(syllable)
             else:
-                return [x]
+                syllables.append(Syllable(*parts))
+                changed = True
+
+        return Word(syllables) if changed else word
+
+
+def _segment_rule(
+    function, context_free: bool, trigger: HigherOrderFunction | None
+) -> SegmentRule:
+    rule = SegmentRule(function)
+    rule.context_free = context_free
+    rule.trigger = trigger
+    return rule
+
 
+def each_segment(f: t.Callable[[Word, Segment], Segment | list[Segment]]):
+    return SegmentRule(f)
+
+
+def context_free(rule: SegmentRule) -> SegmentRule:
+    """
+    Mark an `each_segment` rule as depending only on the segment it is given.
+    Context free rules are called with `None` in place of the word when fused by
+    `chain`.
+    """
+    rule.context_free = True
+    return rule
+
+
+def trigger(predicate: HigherOrderFunction):
+    """
+    Declare that a rule can only change a word with a segment matching `predicate`.
+    `Lexicon.then` uses this to skip every other word.
+    """
+
+    def wrap(rule: SegmentRule) -> SegmentRule:
+        rule.trigger = predicate
+        return rule
+
+    return wrap
+
+
+class FusedRule:
+    """
+    Consecutive context free rules applied as one. The result of running every
+    rule on a segment is worked out the first time that segment is seen, after
+    which applying the whole run is a table lookup per segment.
+    """
+
+    def __init__(self, *rules: SegmentRule) -> None:
+        self.rules = rules
+        # Keyed by id, since segments with the same features but different
+        # symbols are equal.
+        self.table: dict[int, tuple[Segment, ...]] = {}
+
+    def map(self, segment: Segment) -> tuple[Segment, ...]:
+        try:
+            return self.table[segment.id]
+        except KeyError:
+            pass
+
+        output = [segment]
+        for rule in self.rules:
+            changed = []
+            for s in output:
+                result = rule.function(None, s)
+                if isinstance(result, list):
+                    changed += result
+                else:
+                    changed.append(result)
+            output = changed
+
+        self.table[segment.id] = tuple(output)
+        return self.table[segment.id]
+
+    def __call__(self, word: Word) -> Word:
+        map = self.map
+        syllables = []
+        changed = False
         for syllable in word.syllables:
-            onset = list(
-                itertools.chain(
-                    *map(to_list, map(lambda s: f(word, s), syllable.onset))
-                )
-            )
-            nucleus = list(
-                itertools.chain(
-                    *map(to_list, map(lambda s: f(word, s), syllable.nucleus))
-                )
-            )
-            coda = list(
-                itertools.chain(*map(to_list, map(lambda s: f(word, s), syllable.coda)))
+            parts = []
+            same = True
+            for part in (syllable.onset, syllable.nucleus, syllable.coda):
+                output = []
+                for segment in part:
+                    result = map(segment)
+                    output += result
+                    same = same and len(result) == 1 and result[0] is segment
+                parts.append(output)
+            if same:
+                syllables.append(syllable)
+            else:
+                syllables.append(Syllable(*parts))
+                changed = True
+        return Word(syllables) if changed else word
+
+
+class Chain:
+    """
+    Rules applied one after another. Consecutive context free rules (anything with a
+    true `context_free` attribute and a `function(word, segment)` method) are fused
+    into a single `FusedRule`. Nested chains are flattened.
+    """
+
+    def __init__(self, *rules: t.Callable[[Word], Word]) -> None:
+        self.rules: list[t.Callable[[Word], Word]] = []
+        for rule in rules:
+            self.rules += rule.rules if isinstance(rule, Chain) else [rule]
+        self.steps: list[t.Callable[[Word], Word]] = []
+
+        run: list[SegmentRule] = []
+        for rule in self.rules:
+            if getattr(rule, "context_free", False):
+                run.append(rule)
+                continue
+            if run:
+                self.steps.append(FusedRule(*run))
+                run = []
+            self.steps.append(rule)
+        if run:
+            self.steps.append(FusedRule(*run))
+
+    def __call__(self, word: Word) -> Word:
+        stats = instrument.active
+        if stats is not None:
+            for step in self.steps:
+                word = stats.call(step, word)
+            return word
+
+        for step in self.steps:
+            word = step(word)
+        return word
+
+
+def chain(*rules: t.Callable[[Word], Word]) -> Chain:
+    return Chain(*rules)
+
+
+class SyllableTemplate:
+    """
+    Onset, nucleus and coda predicates compiled for syllabification.
+
+    Each predicate is a slot. As in `syllable`, a slot made with `& optional` may be
+    skipped and one made with `& repeat` may match more than once. A word is parsed
+    as a sequence of syllables that each fill the slots in order, by tracking the set
+    of slots every segment could be in. The parse is then read back from the end,
+    keeping segments in the same syllable as the segment after them where possible,
+    which puts consonants in onsets before codas.
+    """
+
+    def __init__(
+        self,
+        onset: list[HigherOrderFunction],
+        nucleus: list[HigherOrderFunction],
+        coda: list[HigherOrderFunction],
+    ) -> None:
+        self.key = SyllableTemplate.fingerprint(onset, nucleus, coda)
+        self.slots = [*onset, *nucleus, *coda]
+        self.sections = (
+            ["onset"] * len(onset) + ["nucleus"] * len(nucleus) + ["coda"] * len(coda)
+        )
+        size = len(self.slots)
+        self.optional = [
+            bool(slot(optional.mask)) or requires(slot, optional) for slot in self.slots
+        ]
+        self.repeat = [
+            bool(slot(ALL_FEATURES | repeat.mask)) or requires(slot, repeat)
+            for slot in self.slots
+        ]
+
+        # Slots a syllable can start or end in.
+        self.first = 0
+        self.last = 0
+        for index in range(size):
+            if all(self.optional[:index]):
+                self.first |= 1 << index
+            if all(self.optional[index + 1 :]):
+                self.last |= 1 << index
+
+        # Slots reachable from each slot without leaving the syllable.
+        self.same: list[int] = []
+        for index in range(size):
+            reachable = 1 << index if self.repeat[index] else 0
+            for after in range(index + 1, size):
+                reachable |= 1 << after
+                if not self.optional[after]:
+                    break
+            self.same.append(reachable)
+
+        self._matches: dict[int, int] = {}
+        self._successors: dict[int, int] = {}
+
+    def matches(self, segment: Segment) -> int:
+        """
+        The slots a segment can fill, as a bit set.
+        """
+        try:
+            return self._matches[segment.mask]
+        except KeyError:
+            features = segment.mask | optional.mask | repeat.mask
+            slots = 0
+            for index, slot in enumerate(self.slots):
+                if slot(features):
+                    slots |= 1 << index
+            self._matches[segment.mask] = slots
+            return slots
+
+    def successors(self, states: int) -> int:
+        try:
+            return self._successors[states]
+        except KeyError:
+            output = 0
+            for index in range(len(self.slots)):
+                if states >> index & 1:
+                    output |= self.same[index]
+                    if self.last >> index & 1:
+                        output |= self.first
+            self._successors[states] = output
+            return output
+
+    def parse(self, segments: list[Segment]) -> list[tuple[int, bool]]:
+        """
+        The slot of each segment, and whether a new syllable starts at it.
+        """
+        reachable = []
+        states = self.first & self.matches(segments[0])
+        reachable.append(states)
+        for segment in segments[1:]:
+            states = self.successors(states) & self.matches(segment)
+            reachable.append(states)
+
+        states &= self.last
+        if not states:
+            raise Exception(f"Invalid Syllable structure: {segments}")
+
+        slot = (states & -states).bit_length() - 1
+        output = [(slot, False)]
+        for index in range(len(segments) - 2, -1, -1):
+            chosen = None
+            new_syllable = False
+            for previous in range(len(self.slots)):
+                if not reachable[index] >> previous & 1:
+                    continue
+                if self.same[previous] >> slot & 1:
+                    chosen = previous
+                    new_syllable = False
+                    break
+                if chosen is None and self.last >> previous & self.first >> slot & 1:
+                    chosen = previous
+                    new_syllable = True
+            output[-1] = (slot, new_syllable)
+            slot = chosen
+            output.append((slot, False))
+
+        output[-1] = (slot, True)
+        output.reverse()
+        return output
+
+    @staticmethod
+    def fingerprint(
+        onset: list[HigherOrderFunction],
+        nucleus: list[HigherOrderFunction],
+        coda: list[HigherOrderFunction],
+    ) -> t.Hashable:
+        """
+        A key that is equal for templates whose predicates compile to the same
+        masks, or `None` if a predicate can not be compiled.
+        """
+        key = []
+        for section in (onset, nucleus, coda):
+            slots = []
+            for predicate in section:
+                terms = predicate.terms()
+                if terms is None:
+                    return None
+                slots.append(tuple(sorted(terms)))
+            key.append(tuple(slots))
+        return tuple(key)
+
+    def syllabify(self, segments: list[Segment]) -> Word:
+        if len(segments) == 0:
+            return Word([Syllable([], [], [])])
+
+        key = None
+        if self.key is not None:
+            key = (self.key, tuple([segment.id for segment in segments]))
+            cached = syllabify_cache.get(key)
+            if cached is not None:
+                return Word([Syllable(*map(list, syllable)) for syllable in cached])
+
+        syllables: list[Syllable] = []
+        for segment, (slot, new_syllable) in zip(segments, self.parse(segments)):
+            if new_syllable:
+                syllables.append(Syllable([], [], []))
+            getattr(syllables[-1], self.sections[slot]).append(segment)
+
+        if key is not None:
+            syllabify_cache[key] = tuple(
+                (tuple(s.onset), tuple(s.nucleus), tuple(s.coda)) for s in syllables
             )
+        return Word(syllables)
 
-            syllables.append(Syllable(onset, nucleus, coda))
 
-        return Word(syllables)
+# Syllabified words keyed by template and segment ids. Entries are stored as tuples
+# and copied into new `Word`s when returned.
+syllabify_cache = LRUCache("syllabify", maxsize=65536)
+
 
-    return out
+_templates: dict[t.Hashable, SyllableTemplate] = {}
+
+
+def template(
+    onset: list[HigherOrderFunction],
+    nucleus: list[HigherOrderFunction],
+    coda: list[HigherOrderFunction],
+) -> SyllableTemplate:
+    """
+    The compiled template for these predicates. Templates are shared between
+    calls with predicates that compile to the same masks. Templates with
+    predicates that can not be compiled are neither shared nor cached.
+    """
+    key = SyllableTemplate.fingerprint(onset, nucleus, coda)
+    if key is None:
+        return SyllableTemplate(onset, nucleus, coda)
+    try:
+        return _templates[key]
+    except KeyError:
+        _templates[key] = SyllableTemplate(onset, nucleus, coda)
+        return _templates[key]
 
 
 def syllabify(
@@ -644,60 +1563,7 @@ def syllabify(
     nucleus: list[HigherOrderFunction],
     coda: list[HigherOrderFunction],
 ):
-    def get_syllable_section(index: int) -> str:
-        if index < len(onset):
-            return "onset"
-        if index < len(onset) + len(nucleus):
-            return "nucleus"
-        return "coda"
-
-    def push_to_last(segment: Segment, index: int, syllables: list[Syllable]):
-        section = get_syllable_section(index)
-        if section == "onset":
-            syllables[len(syllables) - 1].onset.append(segment)
-        if section == "nucleus":
-            syllables[len(syllables) - 1].nucleus.append(segment)
-        if section == "coda":
-            syllables[len(syllables) - 1].coda.append(segment)
-        return syllables
-
-    syllables = []
-
-    index = 0
-    letter_index = 0
-    structure_list = onset + nucleus + coda
-    syllables.append(Syllable([], [], []))
-
-    while letter_index < len(segments):
-        segment = segments[letter_index]
-        check = structure_list[index]
-        prev_index = (index - 1) % len(structure_list)
-        prev_check = structure_list[prev_index]
-
-        features = segment.features + [optional] + [repeat]
-
-        if check(features):
-            syllables = push_to_last(segment, index, syllables)
-            letter_index += 1
-        elif prev_check(all_features + [repeat]) & prev_check(features):
-            last_syllable = syllables[len(syllables) - 1]
-            if len(last_syllable.onset + last_syllable.nucleus + last_syllable.coda) == 0:
-                syllables.pop()
-            syllables = push_to_last(segment, prev_index, syllables)
-            letter_index += 1
-            index -= 1
-        elif check([optional]):
-            pass
-        else:
-            raise Exception(f"Invalid Syllable structure: {syllables}")
-
-        if index == len(structure_list) - 1 and letter_index < len(segments):
-            syllables.append(Syllable([], [], []))
-            index = 0
-        else:
-            index += 1
-
-    return Word(syllables)
+    return template(onset, nucleus, coda).syllabify(list(segments))
 
 
 def syllabify_string(
@@ -706,10 +1572,7 @@ def syllabify_string(
     nucleus: list[HigherOrderFunction],
     coda: list[HigherOrderFunction],
 ):
-    out = []
-    for s in string:
-        out.append(find(s))
-    return syllabify(out, onset, nucleus, coda)
+    return syllabify(tokenizer().tokenize(string), onset, nucleus, coda)
 
 
 def resyllabify(
@@ -718,20 +1581,71 @@ def resyllabify(
     coda: list[HigherOrderFunction],
 ):
     def wrap(f: t.Callable[[Word], any]):
-        def out(word: Word):
-            segments = word.flatten()
-            return syllabify(segments, onset, nucleus, coda)
-
-        return out
+        return ResyllabifyRule(f, onset, nucleus, coda)
 
     return wrap
 
 
+class ResyllabifyRule:
+    """
+    A rule made with `resyllabify`: the word is flattened and syllabified again.
+    """
+
+    def __init__(
+        self,
+        function: t.Callable[[Word], t.Any],
+        onset: list[HigherOrderFunction],
+        nucleus: list[HigherOrderFunction],
+        coda: list[HigherOrderFunction],
+    ) -> None:
+        functools.update_wrapper(self, function)
+        self.function = function
+        self.onset = onset
+        self.nucleus = nucleus
+        self.coda = coda
+        self.template = template(onset, nucleus, coda)
+
+    def __reduce__(self):
+        if _importable(self):
+            return (qualified, (self.__module__, self.__qualname__))
+        return (
+            ResyllabifyRule,
+            (self.function, self.onset, self.nucleus, self.coda),
+        )
+
+    def __call__(self, word: Word) -> Word:
+        output = self.template.syllabify(word.flatten())
+        if len(output.syllables) == len(word.syllables) and all(
+            len(a.onset) == len(b.onset)
+            and len(a.nucleus) == len(b.nucleus)
+            and len(a.coda) == len(b.coda)
+            for a, b in zip(output.syllables, word.syllables)
+        ):
+            return word
+        return output
+
+
 @dataclass
 class Word:
     syllables: list[Syllable]
 
-    def show(self, printer: t.Callable[[Segment], str] = _default_word_printer) -> None:
+    def key(self) -> tuple:
+        """
+        The keys of the syllables. Like `Syllable.key` it is worked out every time.
+        """
+        return tuple(syllable.key() for syllable in self.syllables)
+
+    def __eq__(self, other):
+        if not isinstance(other, Word):
+            return NotImplemented
+        return self is other or self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def render(
+        self, printer: t.Callable[[Segment], str] = _default_word_printer
+    ) -> str:
         output = []
         for syllable in self.syllables:
             output += (
@@ -743,7 +1657,10 @@ class Word:
                 )
                 + "."
             )
-        print("".join(output))
+        return "".join(output)
+
+    def show(self, printer: t.Callable[[Segment], str] = _default_word_printer) -> None:
+        print(self.render(printer))
         return self
 
     def flatten(self) -> list[Segment]:
@@ -781,23 +1698,30 @@ class Word:
 
         raise Exception("Unknown overload")
 
-    def _matches(self, before, syllable, after):
-        syllables = self.flatten()
-        index = syllables.index(syllable)
+    def _position(self, segment: Segment) -> tuple[list[Segment], int]:
+        """
+        Find the flattened segments of the word and the index of a segment in them.
+        """
+        segments = self.flatten()
+        # `list.index` would also find a different segment with the same features.
+        return segments, next(i for i, s in enumerate(segments) if s is segment)
+
+    def _matches(self, before, segment, after):
+        segments, index = self._position(segment)
 
         if (index - len(before)) < 0:
             return False
 
-        if (index + len(after)) >= len(syllables):
+        if (index + len(after)) >= len(segments):
             return False
 
-        before_part = syllables[index - len(before) : index]
-        after_part = syllables[index + 1 : index + 1 + len(after)]
+        before_part = segments[index - len(before) : index]
+        after_part = segments[index + 1 : index + 1 + len(after)]
 
         def matches(parts, funcs):
             if len(funcs) == 0:
                 return True
-            return all(b(a.features) for (a, b) in zip(parts, funcs))
+            return all(b(a.mask) for (a, b) in zip(parts, funcs))
 
         if not matches(before_part, before):
             return False
@@ -808,6 +1732,15 @@ class Word:
         return True
 
     def then(self, sound_change: t.Callable[[Word], Word]) -> t.Self:
+        """
+        Apply a rule. Rules return the word they were given when they change
+        nothing, and a changed word shares its unchanged syllables with this one,
+        so `word.then(rule) is word` tells whether a rule applied.
+        """
+        stats = instrument.active
+        # A chain records each of its steps itself.
+        if stats is not None and not isinstance(sound_change, Chain):
+            return stats.call(sound_change, self)
         return sound_change(self)
 
     def _includes(self, search: HigherOrderFunction, list: list[Feature]) -> bool:
@@ -815,7 +1748,7 @@ class Word:
         Find if a Feature exists in a list of Features.
         """
         for segment in list:
-            result = search(segment.features)
+            result = search(segment.mask)
             if result == True:
                 return True
         return False
@@ -831,34 +1764,57 @@ class Word:
         """
         Find if a segment with the features given exists within a word, before another segment.
         """
-        flattenedSegments = self.flatten()
-        index = flattenedSegments.index(segment)
+        flattenedSegments, index = self._position(segment)
         return self._includes(includes, flattenedSegments[index:])
 
     def includes_after(self, segment: Segment, includes: HigherOrderFunction) -> bool:
         """
         Find if a segment with the features given exists within a word, after another segment.
         """
-        flattenedSegments = self.flatten()
-        index = flattenedSegments.index(segment)
+        flattenedSegments, index = self._position(segment)
         return self._includes(includes, flattenedSegments[:index])
 
     def first(self, segment: Segment) -> bool:
         """
         Find if a segment is the first segment in a word.
         """
-        flattenedSegments = self.flatten()
-        return self._includes(flattenedSegments.index(segment) == 0)
+        _, index = self._position(segment)
+        return index == 0
 
     def last(self, segment: Segment) -> bool:
         """
         Find if a segment is the last segment in a word.
         """
-        flattenedSegments = self.flatten()
-        return self._includes(
-            flattenedSegments.index(segment) == len(flattenedSegments) - 1
+        flattenedSegments, index = self._position(segment)
+        return index == len(flattenedSegments) - 1
+
+
+class Context(Word):
+    """
+    The word handed to an `each_segment` rule. The word is flattened once and the
+    position of the segment being visited is tracked, so environment queries are
+    slices of `segments` instead of a search for the segment.
+    """
+
+    def __init__(self, word: Word) -> None:
+        super().__init__(word.syllables)
+        self.word = word
+        self.segments = word.flatten()
+        self.index = 0
+
+    def flatten(self) -> list[Segment]:
+        return list(self.segments)
+
+    def _position(self, segment: Segment) -> tuple[list[Segment], int]:
+        if self.segments[self.index] is segment:
+            return self.segments, self.index
+        return self.segments, next(
+            i for i, s in enumerate(self.segments) if s is segment
         )
 
+    def includes(self, includes: HigherOrderFunction) -> bool:
+        return self._includes(includes, self.segments)
+
 
 def merge(features: list[Feature]) -> HigherOrderFunction:
     output = features[0]
@@ -868,25 +1824,33 @@ def merge(features: list[Feature]) -> HigherOrderFunction:
     return output
 
 
+@functools.cache
+def _inventory_features() -> list[Feature]:
+    """
+    Every feature used by the segment inventory, in registration order.
+    """
+    inventory = 0
+    for segment in _segments():
+        inventory |= segment.mask
+    return to_features(inventory)
+
+
+@functools.cache
 def select(symbol: str) -> Feature:
-    features = ipa(symbol)[0].features
-    full_features = list(itertools.chain.from_iterable([s.features for s in SEGMENTS]))
-    all_features: list[Feature] = []
-    [all_features.append(x) for x in full_features if x not in all_features]
+    features = ipa(symbol)[0].mask
 
-    output = features[0]
-    for i in range(0, len(all_features) - 1):
-        next_feature = all_features[i + 1]
-        if next_feature in features:
-            output = output & next_feature
+    output = _
+    for feature in _inventory_features():
+        if feature.mask & features:
+            output = output & feature
         else:
-            output = output & -next_feature
+            output = output & -feature
 
     return output
 
 
 def find(symbol: str) -> Segment:
-    return next(filter(lambda x: x.ipa_symbol == symbol, SEGMENTS))
+    return tokenizer().find(symbol)
 
 
 def probability(feature: Feature, chance: float):
@@ -0,0 +1,277 @@
+from __future__ import annotations
+import bisect
+import gc
+import time
+import typing as t
+
+from washitsu import instrument
+from washitsu import (
+    Chain,
+    HigherOrderFunction,
+    Feature,
+    Segment,
+    Syllable,
+    Word,
+    each_segment,
+    to_features,
+    to_mask,
+)
+
+__all__ = ["Change", "Batch", "apply"]
+
+
+class Change:
+    """
+    A sound change of the form `before target after`: every segment matching
+    `target` whose neighbours match `before` and `after` gains the features in
+    `add` and loses the ones in `remove`.
+
+    A `Change` can be passed to `Word.then` like any other rule. When all of its
+    predicates compile to feature masks it can also be applied to many words at
+    once with `apply`.
+    """
+
+    def __init__(
+        self,
+        target: HigherOrderFunction,
+        add: t.Sequence[Feature] = (),
+        remove: t.Sequence[Feature] = (),
+        before: t.Sequence[HigherOrderFunction] = (),
+        after: t.Sequence[HigherOrderFunction] = (),
+    ) -> None:
+        self.target = target
+        self.add = to_mask(add)
+        self.remove = to_mask(remove)
+        self.before = list(before)
+        self.after = list(after)
+        self._rule = each_segment(self._change)
+        self.trigger = target
+
+    def __repr__(self):
+        return (
+            f"Change({self.target!r}, add={to_features(self.add)!r}, "
+            f"remove={to_features(self.remove)!r}, before={self.before!r}, "
+            f"after={self.after!r})"
+        )
+
+    def __call__(self, word: Word) -> Word:
+        return self._rule(word)
+
+    def _change(self, word: Word, segment: Segment) -> Segment:
+        if segment.has(self.target) and word.matches(self.before, segment, self.after):
+            return Segment(segment.ipa_symbol, (segment.mask | self.add) & ~self.remove)
+        return segment
+
+    def vectorizable(self) -> bool:
+        return all(
+            predicate.terms() is not None
+            for predicate in [self.target, *self.before, *self.after]
+        )
+
+
+def _bit_positions(plane: int) -> t.Iterator[int]:
+    bits = bin(plane)[:1:-1]
+    index = bits.find("1")
+    while index != -1:
+        yield index
+        index = bits.find("1", index + 1)
+
+
+class Batch:
+    """
+    Many words encoded for bit-parallel rule application.
+
+    The segments of every word are laid out in one row, with an empty slot (`None`)
+    before each word. For each feature there is a plane: an integer whose bit `i` is set
+    when the segment at position `i` has that feature. A predicate is evaluated
+    for every position at once by and-ing planes, and a neighbour condition is the
+    same result shifted by the distance to the neighbour. The empty slots never
+    match, so a shifted condition can not leak from one word into the next.
+    """
+
+    def __init__(self, segments: list[Segment | None]) -> None:
+        self.segments = list(segments)
+        self.changed: set[int] = set()
+        self._words: list[Word] = []
+        self._starts: list[int] = []
+        # The position of every syllable, and the index of the first syllable of
+        # every word.
+        self._syllables: list[int] = []
+        self._firsts: list[int] = []
+
+        self.masks = [
+            0 if segment is None else segment.mask for segment in self.segments
+        ]
+        self.valid = int(
+            "".join(
+                "0" if segment is None else "1" for segment in reversed(self.segments)
+            )
+            or "0",
+            2,
+        )
+        self.planes = self._planes(self.masks)
+
+    @classmethod
+    def from_words(cls, words: list[Word]) -> Batch:
+        segments: list[Segment | None] = []
+        starts: list[int] = []
+        syllables: list[int] = []
+        firsts: list[int] = []
+        for word in words:
+            segments.append(None)
+            starts.append(len(segments))
+            firsts.append(len(syllables))
+            for syllable in word.syllables:
+                syllables.append(len(segments))
+                segments += syllable.onset
+                segments += syllable.nucleus
+                segments += syllable.coda
+
+        batch = cls(segments)
+        batch._words = list(words)
+        batch._starts = starts
+        batch._syllables = syllables
+        batch._firsts = firsts
+        return batch
+
+    @staticmethod
+    def _planes(masks: list[int]) -> dict[int, int]:
+        """
+        Build one plane per feature. Positions are first coded by their distinct
+        mask so each plane is a single `bytes.translate` and `int(..., 2)`.
+        """
+        distinct = list(set(masks))
+        union = 0
+        for mask in distinct:
+            union |= mask
+        features = to_features(union)
+        if len(distinct) > 256:
+            return {
+                feature.index: int(
+                    "".join("1" if m & feature.mask else "0" for m in reversed(masks))
+                    or "0",
+                    2,
+                )
+                for feature in features
+            }
+
+        codes = {mask: code for code, mask in enumerate(distinct)}
+        encoded = bytes([codes[mask] for mask in reversed(masks)])
+        planes = {}
+        for feature in features:
+            table = bytearray(b"0" * 256)
+            for mask, code in codes.items():
+                if mask & feature.mask:
+                    table[code] = ord("1")
+            planes[feature.index] = int(encoded.translate(table) or b"0", 2)
+        return planes
+
+    def select(self, predicate: HigherOrderFunction) -> int:
+        """
+        The positions matching a predicate, as a bit set.
+        """
+        terms = predicate.terms()
+        if terms is None:
+            raise Exception(f"Predicate can not be vectorized: {predicate}")
+
+        output = 0
+        for req, forb in terms:
+            plane = self.valid
+            for feature in to_features(req):
+                plane &= self.planes.get(feature.index, 0)
+            for feature in to_features(forb):
+                plane &= ~self.planes.get(feature.index, 0)
+            output |= plane
+        return output
+
+    def apply(self, change: Change) -> int:
+        """
+        Apply a change to every position at once, returning the number of
+        segments it changed.
+        """
+        matched = self.select(change.target)
+        for distance, predicate in enumerate(reversed(change.before), 1):
+            matched &= self.select(predicate) << distance
+        for distance, predicate in enumerate(change.after, 1):
+            matched &= self.select(predicate) >> distance
+
+        for feature in to_features(change.add):
+            self.planes[feature.index] = self.planes.get(feature.index, 0) | matched
+        for feature in to_features(change.remove):
+            if feature.index in self.planes:
+                self.planes[feature.index] &= ~matched
+
+        changed = 0
+        for position in _bit_positions(matched):
+            segment = self.segments[position]
+            mask = (self.masks[position] | change.add) & ~change.remove
+            if mask != segment.mask:
+                self.masks[position] = mask
+                self.segments[position] = Segment(segment.ipa_symbol, mask)
+                self.changed.add(position)
+                changed += 1
+        return changed
+
+    def words(self) -> list[Word]:
+        """
+        Rebuild the words of a batch made with `from_words`. Only the syllables
+        with a changed segment are made again; the rest are shared with the words
+        the batch was made from, and words without a changed segment are returned
+        as they were.
+        """
+        changed: dict[int, set[int]] = {}
+        for position in self.changed:
+            index = bisect.bisect_right(self._starts, position) - 1
+            syllable = bisect.bisect_right(self._syllables, position) - 1
+            changed.setdefault(index, set()).add(syllable)
+
+        # Making this many objects at once sets off collections that walk every
+        # word in memory, and the objects made here can not form cycles.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            output = list(self._words)
+            for index, numbers in changed.items():
+                first = self._firsts[index]
+                syllables = list(self._words[index].syllables)
+                for number in numbers:
+                    syllable = syllables[number - first]
+                    position = self._syllables[number]
+                    parts = []
+                    for part in (syllable.onset, syllable.nucleus, syllable.coda):
+                        parts.append(self.segments[position : position + len(part)])
+                        position += len(part)
+                    syllables[number - first] = Syllable(*parts)
+                output[index] = Word(syllables)
+        finally:
+            if enabled:
+                gc.enable()
+        return output
+
+
+def apply(words: list[Word], *rules: t.Callable[[Word], Word]) -> list[Word]:
+    """
+    Apply rules to every word in order. Runs of vectorizable `Change`s share one
+    `Batch`; any other rule is applied to each word with `Word.then`.
+    """
+    stats = instrument.active
+    batch: Batch | None = None
+    for rule in Chain(*rules).steps:
+        if isinstance(rule, Change) and rule.vectorizable():
+            if batch is None:
+                batch = Batch.from_words(words)
+            start = time.perf_counter()
+            changed = batch.apply(rule)
+            if stats is not None:
+                elapsed = time.perf_counter() - start
+                visited = len(batch.segments) - len(words)
+                stats.record(rule, elapsed, len(words), visited, changed)
+        else:
+            if batch is not None:
+                words = batch.words()
+                batch = None
+            words = [word.then(rule) for word in words]
+
+    if batch is not None:
+        words = batch.words()
+    return list(words)
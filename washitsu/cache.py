@@ -0,0 +1,69 @@
+from __future__ import annotations
+from collections import OrderedDict
+import typing as t
+
+__all__ = ["LRUCache", "CacheInfo", "CACHES"]
+
+
+class CacheInfo(t.NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache:
+    """
+    A mapping with a maximum size that evicts the least recently used entry.
+    Lookups through `get` are counted as hits or misses.
+
+    Every cache is registered in `CACHES` under its name.
+    """
+
+    def __init__(self, name: str, maxsize: int = 65536) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[t.Hashable, t.Any] = OrderedDict()
+        CACHES[name] = self
+
+    def get(self, key: t.Hashable, default: t.Any = None) -> t.Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key: t.Hashable, value: t.Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key: t.Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def resize(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        while len(self._data) > max(maxsize, 0):
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+
+CACHES: dict[str, LRUCache] = {}
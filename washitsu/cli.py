@@ -0,0 +1,139 @@
+from __future__ import annotations
+import argparse
+import sys
+import typing as t
+
+from washitsu import (
+    SyllableTemplate,
+    Word,
+    chain,
+    optional,
+    qualified,
+    repeat,
+    syllabic,
+    template,
+    tokenizer,
+)
+
+__all__ = ["load", "read", "pipeline", "main"]
+
+
+def load(name: str) -> t.Any:
+    """
+    Load an object from a `module:attribute` name, like `washitsu.rules:umlaut`.
+    """
+    module, _, attribute = name.partition(":")
+    if not attribute:
+        raise Exception(f"Expected module:attribute, got {name}")
+    try:
+        return qualified(module, attribute)
+    except (ImportError, AttributeError) as error:
+        raise Exception(f"Can not load {name}: {error}") from error
+
+
+def default_template() -> SyllableTemplate:
+    return template(
+        [-syllabic & optional & repeat],
+        [syllabic & repeat],
+        [-syllabic & optional],
+    )
+
+
+def read(
+    lines: t.Iterable[str],
+    syllables: SyllableTemplate,
+    strict: bool = False,
+    errors: t.TextIO | None = None,
+) -> t.Iterator[Word]:
+    """
+    Tokenize and syllabify one word per line. Blank lines and lines starting with
+    `#` are skipped. A line that can not be read is reported on `errors` (stderr
+    by default) with its line number and skipped, or with `strict` raises an
+    exception naming the line.
+    """
+    tokens = tokenizer()
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            word = syllables.syllabify(tokens.tokenize(line))
+        except Exception as error:
+            if strict:
+                raise Exception(f"Line {number}: {error}") from error
+            print(f"line {number}: {error}", file=errors or sys.stderr)
+            continue
+        yield word
+
+
+def pipeline(
+    lines: t.Iterable[str],
+    rules: list[t.Callable[[Word], Word]],
+    syllables: SyllableTemplate | None = None,
+    strict: bool = False,
+) -> t.Iterator[str]:
+    """
+    Apply rules to the words in `lines` one at a time and yield them rendered.
+    Only one word is held in memory at once. Lines that can not be read are
+    handled like in `read`.
+    """
+    rule = chain(*rules)
+    for word in read(lines, syllables or default_template(), strict):
+        yield word.then(rule).render()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="washitsu",
+        description="Apply sound changes to a list of IPA words, one per line.",
+    )
+    parser.add_argument(
+        "rules",
+        nargs="*",
+        help="rules to apply in order, as module:attribute",
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=argparse.FileType("r", encoding="utf-8"),
+        default=sys.stdin,
+        help="file to read words from (default: stdin)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=argparse.FileType("w", encoding="utf-8"),
+        default=sys.stdout,
+        help="file to write words to (default: stdout)",
+    )
+    parser.add_argument(
+        "-t",
+        "--template",
+        help="syllable template as module:attribute (default: C*V+C?)",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="stop at the first line that can not be read instead of skipping it",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        rules = [load(name) for name in args.rules]
+        syllables = load(args.template) if args.template else default_template()
+    except Exception as error:
+        parser.error(str(error))
+
+    try:
+        for line in pipeline(args.input, rules, syllables, args.strict):
+            args.output.write(line + "\n")
+    except Exception as error:
+        if not args.strict:
+            raise
+        args.output.flush()
+        parser.exit(1, f"{parser.prog}: {error}\n")
+    args.output.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+from __future__ import annotations
+import abc
+import bisect
+import itertools
+import math
+import random
+import typing as t
+
+from washitsu import Feature, HigherOrderFunction, Segment, Syllable, Word, _
+
+__all__ = ["Pool", "Generator", "Constraint", "Banned", "OCP", "Sonority"]
+
+# A slot is a predicate, or a predicate and the chance that the slot is filled.
+Slot = t.Union[HigherOrderFunction, tuple[HigherOrderFunction, float], None]
+
+
+class RandomSource(t.Protocol):
+    def random(self) -> float: ...
+
+
+def _rng(seed: int | RandomSource | None) -> RandomSource:
+    """
+    Anything with a `random()` method that returns a float in [0, 1) can be used,
+    including `random.Random` and `numpy.random.Generator`.
+    """
+    if seed is None or isinstance(seed, int):
+        return random.Random(seed)
+    return seed
+
+
+class Pool:
+    """
+    The segments that can fill a slot, sampled in constant time with the alias
+    method.
+    """
+
+    def __init__(self, segments: list[Segment], weights: list[float]) -> None:
+        if not segments:
+            raise Exception("Can not sample from an empty pool")
+
+        self.segments = segments
+        self.weights = weights
+        size = len(segments)
+        total = sum(weights)
+        scaled = [weight * size / total for weight in weights]
+        self.probability = [1.0] * size
+        self.alias = list(range(size))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def sample(self, rng: RandomSource) -> Segment:
+        value = rng.random() * len(self.segments)
+        index = int(value)
+        if value - index < self.probability[index]:
+            return self.segments[index]
+        return self.segments[self.alias[index]]
+
+
+class Constraint(abc.ABC):
+    """
+    A restriction on two segments in a row. `allows` is given the previous segment
+    and the section it is in ("onset", "nucleus" or "coda"), the next segment and
+    its section, and whether a syllable boundary is between them.
+    """
+
+    @abc.abstractmethod
+    def allows(
+        self,
+        previous: Segment,
+        previous_section: str,
+        segment: Segment,
+        section: str,
+        boundary: bool,
+    ) -> bool: ...
+
+
+class Banned(Constraint):
+    """
+    A segment matching `first` may not be followed by one matching `second`. With
+    `within=False` the pair is only banned across a syllable boundary, and with
+    `across=False` only inside a syllable.
+    """
+
+    def __init__(
+        self,
+        first: HigherOrderFunction,
+        second: HigherOrderFunction,
+        within: bool = True,
+        across: bool = True,
+    ) -> None:
+        self.first = first
+        self.second = second
+        self.within = within
+        self.across = across
+
+    def allows(self, previous, previous_section, segment, section, boundary):
+        if not (self.across if boundary else self.within):
+            return True
+        return not (self.first(previous.mask) and self.second(segment.mask))
+
+
+class OCP(Constraint):
+    """
+    The obligatory contour principle: two segments in a row that match `among` may
+    not share any of `features`, like two consonants with the same place.
+    """
+
+    def __init__(self, features: list[Feature], among: HigherOrderFunction = _):
+        self.features = features
+        self.among = among
+
+    def allows(self, previous, previous_section, segment, section, boundary):
+        if not (self.among(previous.mask) and self.among(segment.mask)):
+            return True
+        return not any(
+            previous.mask & feature.mask and segment.mask & feature.mask
+            for feature in self.features
+        )
+
+
+class Sonority(Constraint):
+    """
+    Sonority rises through an onset and falls through a coda. `scale` lists
+    predicates from least to most sonorous; the sonority of a segment is the
+    position of the last one it matches.
+    """
+
+    def __init__(self, scale: list[HigherOrderFunction]) -> None:
+        self.scale = scale
+        self._ranks: dict[Segment, int] = {}
+
+    def rank(self, segment: Segment) -> int:
+        try:
+            return self._ranks[segment]
+        except KeyError:
+            rank = -1
+            for index, predicate in enumerate(self.scale):
+                if predicate(segment.mask):
+                    rank = index
+            self._ranks[segment] = rank
+            return rank
+
+    def allows(self, previous, previous_section, segment, section, boundary):
+        if boundary or previous_section != section:
+            return True
+        if section == "onset":
+            return self.rank(previous) < self.rank(segment)
+        if section == "coda":
+            return self.rank(previous) > self.rank(segment)
+        return True
+
+
+# The last segment placed, its section, and whether it is in the syllable being
+# filled. It is all constraints need to know about what came before.
+State = tuple[t.Optional[Segment], t.Optional[str], bool]
+START: State = (None, None, False)
+
+
+class Generator:
+    """
+    Makes random words out of an inventory and a syllable template.
+
+    The segments that can fill each slot are worked out once. `weights` gives the
+    relative frequency of segments; segments without a weight have weight 1. A slot
+    given as `(predicate, chance)` is only filled with that chance, like
+    `probability`.
+
+    With `constraints`, every word made satisfies them. For each slot and each
+    possible previous segment, the probability that the rest of the word can be
+    completed is worked out backwards and kept, and segments are sampled in
+    proportion to it. Segments that would break a constraint or leave no valid
+    way to finish the word are never drawn, and words come out with the same
+    distribution as generating freely and throwing invalid words away, at a cost
+    that does not depend on how many would be thrown away.
+    """
+
+    def __init__(
+        self,
+        segments: list[Segment],
+        onset: list[Slot],
+        nucleus: list[Slot],
+        coda: list[Slot],
+        weights: t.Mapping[Segment, float] | None = None,
+        constraints: t.Sequence[Constraint] = (),
+    ) -> None:
+        self.constraints = list(constraints)
+        weights = weights or {}
+        self.sections: list[list[tuple[Pool, float]]] = []
+        self.slots: list[tuple[Pool, float, str]] = []
+        for name, section in zip(("onset", "nucleus", "coda"), (onset, nucleus, coda)):
+            slots = []
+            for slot in section:
+                if slot is None:
+                    continue
+                predicate, chance = slot if isinstance(slot, tuple) else (slot, 1.0)
+                candidates = [s for s in segments if predicate(s.mask)]
+                if not candidates:
+                    raise Exception(f"No segments match {predicate!r}")
+                pool = Pool(candidates, [weights.get(s, 1.0) for s in candidates])
+                slots.append((pool, chance))
+                self.slots.append((pool, chance, name))
+            self.sections.append(slots)
+
+        self._candidates: dict[tuple[int, State], list[tuple[Segment, float]]] = {}
+        self._ends: dict[tuple[int, State], dict[State, float]] = {}
+        self._levels: list[dict[State, float]] = []
+        self._scales: list[float] = []
+        self._options: dict[
+            tuple[int, int, State], tuple[list[Segment | None], list[float]]
+        ] = {}
+
+    def _allows(self, state: State, segment: Segment, section: str) -> bool:
+        previous, previous_section, same = state
+        if previous is None:
+            return True
+        return all(
+            constraint.allows(previous, previous_section, segment, section, not same)
+            for constraint in self.constraints
+        )
+
+    def candidates(self, slot: int, state: State) -> list[tuple[Segment, float]]:
+        """
+        The segments that can fill a slot after `state` without breaking a
+        constraint, with the chance that the slot is filled with each.
+        """
+        key = (slot, state)
+        try:
+            return self._candidates[key]
+        except KeyError:
+            pass
+
+        pool, chance, section = self.slots[slot]
+        weight = min(chance, 1.0) / sum(pool.weights)
+        output = [
+            (segment, weight * segment_weight)
+            for segment, segment_weight in zip(pool.segments, pool.weights)
+            if self._allows(state, segment, section)
+        ]
+        self._candidates[key] = output
+        return output
+
+    def _syllable_ends(self, slot: int, state: State) -> dict[State, float]:
+        """
+        The probability that freely filling the rest of a syllable from `slot` on
+        satisfies the constraints, by the state the syllable ends in.
+        """
+        key = (slot, state)
+        try:
+            return self._ends[key]
+        except KeyError:
+            pass
+
+        output: dict[State, float] = {}
+        if slot == len(self.slots):
+            output[(state[0], state[1], False)] = 1.0
+        else:
+            _, chance, section = self.slots[slot]
+            branches = [(state, 1.0 - chance)] if chance < 1.0 else []
+            branches += [
+                ((segment, section, True), probability)
+                for segment, probability in self.candidates(slot, state)
+            ]
+            for following, probability in branches:
+                for end, mass in self._syllable_ends(slot + 1, following).items():
+                    output[end] = output.get(end, 0.0) + probability * mass
+        self._ends[key] = output
+        return output
+
+    def _level(self, remaining: int) -> dict[State, float]:
+        """
+        For every state a syllable can start in, the probability that `remaining`
+        more syllables made freely satisfy the constraints. Levels are worked out
+        one after another from the end of the word, and each is divided by its
+        largest value so long words do not underflow; the log of what it was
+        divided by in total is kept in `_scales`.
+        """
+        if not self._levels:
+            starts = {START}
+            queue = [START]
+            while queue:
+                for end in self._syllable_ends(0, queue.pop()):
+                    if end not in starts:
+                        starts.add(end)
+                        queue.append(end)
+            self._levels.append(dict.fromkeys(starts, 1.0))
+            self._scales.append(0.0)
+
+        while len(self._levels) <= remaining:
+            previous = self._levels[-1]
+            level = {
+                start: sum(
+                    mass * previous[end]
+                    for end, mass in self._syllable_ends(0, start).items()
+                )
+                for start in previous
+            }
+            largest = max(level.values())
+            if largest > 0:
+                level = {start: mass / largest for start, mass in level.items()}
+                self._scales.append(self._scales[-1] + math.log(largest))
+            else:
+                self._scales.append(-math.inf)
+            self._levels.append(level)
+        return self._levels[remaining]
+
+    def _mass(self, remaining: int, slot: int, state: State) -> float:
+        """
+        The probability that freely filling the slots from `slot` on, followed by
+        `remaining` more syllables, satisfies the constraints, divided by the
+        scale of level `remaining`.
+        """
+        level = self._level(remaining)
+        return sum(
+            mass * level[end] for end, mass in self._syllable_ends(slot, state).items()
+        )
+
+    def options(
+        self, remaining: int, slot: int, state: State
+    ) -> tuple[list[Segment | None], list[float]]:
+        """
+        What can fill a slot, with `None` for leaving it empty, and the running
+        total of their probabilities of leading to a valid word.
+        """
+        key = (remaining, slot, state)
+        try:
+            return self._options[key]
+        except KeyError:
+            pass
+
+        _, chance, section = self.slots[slot]
+        choices: list[Segment | None] = []
+        masses: list[float] = []
+        total = 0.0
+        if chance < 1.0:
+            mass = (1.0 - chance) * self._mass(remaining, slot + 1, state)
+            if mass > 0:
+                total += mass
+                choices.append(None)
+                masses.append(total)
+
+        for segment, probability in self.candidates(slot, state):
+            following = (segment, section, True)
+            mass = probability * self._mass(remaining, slot + 1, following)
+            if mass > 0:
+                total += mass
+                choices.append(segment)
+                masses.append(total)
+
+        self._options[key] = (choices, masses)
+        return choices, masses
+
+    def _constrained(self, syllables: int, rng: RandomSource) -> Word:
+        state = START
+        output = []
+        for remaining in range(syllables - 1, -1, -1):
+            parts: dict[str, list[Segment]] = {"onset": [], "nucleus": [], "coda": []}
+            for slot, (_, _, section) in enumerate(self.slots):
+                choices, masses = self.options(remaining, slot, state)
+                if not choices:
+                    raise Exception("No word satisfies the constraints")
+                index = bisect.bisect_right(masses, rng.random() * masses[-1])
+                segment = choices[min(index, len(choices) - 1)]
+                if segment is not None:
+                    parts[section].append(segment)
+                    state = (segment, section, True)
+            output.append(Syllable(parts["onset"], parts["nucleus"], parts["coda"]))
+            state = (state[0], state[1], False)
+        return Word(output)
+
+    def syllable(self, rng: int | RandomSource | None = None) -> Syllable:
+        rng = _rng(rng)
+        if self.constraints:
+            return self._constrained(1, rng).syllables[0]
+        parts = []
+        for section in self.sections:
+            parts.append(
+                [
+                    pool.sample(rng)
+                    for pool, chance in section
+                    if chance >= 1.0 or chance > rng.random()
+                ]
+            )
+        return Syllable(*parts)
+
+    def word(self, syllables: int, rng: int | RandomSource | None = None) -> Word:
+        rng = _rng(rng)
+        if self.constraints:
+            return self._constrained(syllables, rng)
+        return Word([self.syllable(rng) for _ in range(syllables)])
+
+    def words(
+        self,
+        count: int,
+        syllables: tuple[int, int] = (1, 1),
+        rng: int | RandomSource | None = None,
+    ) -> list[Word]:
+        """
+        Make `count` words with between `syllables[0]` and `syllables[1]` syllables.
+        Passing the same seed gives the same words.
+        """
+        rng = _rng(rng)
+        low, high = syllables
+        span = high - low + 1
+        onset, nucleus, coda = self.sections
+
+        if self.constraints:
+            # Word lengths are drawn as often as they would be among valid words.
+            logs = []
+            for length in range(low, high + 1):
+                mass = self._mass(length - 1, 0, START)
+                scale = self._scales[length - 1]
+                logs.append(math.log(mass) + scale if mass > 0 else -math.inf)
+            largest = max(logs)
+            if largest == -math.inf:
+                raise Exception("No word satisfies the constraints")
+            totals = list(itertools.accumulate(math.exp(log - largest) for log in logs))
+            total = totals[-1]
+            lengths = range(low, high + 1)
+            output = []
+            for _ in range(count):
+                index = bisect.bisect_right(totals, rng.random() * total)
+                output.append(self._constrained(lengths[min(index, span - 1)], rng))
+            return output
+
+        def part(section):
+            return [
+                pool.sample(rng)
+                for pool, chance in section
+                if chance >= 1.0 or chance > rng.random()
+            ]
+
+        output = []
+        for _ in range(count):
+            length = low + int(rng.random() * span)
+            output.append(
+                Word(
+                    [
+                        Syllable(part(onset), part(nucleus), part(coda))
+                        for _ in range(length)
+                    ]
+                )
+            )
+        return output
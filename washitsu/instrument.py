@@ -0,0 +1,220 @@
+from __future__ import annotations
+import contextlib
+import difflib
+import time
+import typing as t
+
+__all__ = ["RuleStats", "Stats", "instrumented", "enable", "disable"]
+
+# The stats being recorded, or None when instrumentation is off. `Word.then` and
+# `Chain` only check this, so leaving instrumentation compiled in costs one lookup
+# per rule.
+active: Stats | None = None
+
+
+class RuleStats:
+    """
+    What was recorded for one rule.
+
+    `visited` is the number of segments the rule was given and `changed` the number
+    of segments that differ between the input and the output once they are
+    aligned, so an inserted or deleted segment does not count every segment after
+    it as changed.
+    """
+
+    __slots__ = ("name", "calls", "seconds", "max_seconds", "visited", "changed")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.visited = 0
+        self.changed = 0
+
+    def __repr__(self):
+        return (
+            f"RuleStats({self.name}, calls={self.calls}, seconds={self.seconds:.6f}, "
+            f"visited={self.visited}, changed={self.changed})"
+        )
+
+    def as_dict(self) -> dict[str, t.Any]:
+        return {name: getattr(self, name) for name in RuleStats.__slots__}
+
+
+def _name(rule: t.Any) -> str:
+    # Chains and fused rules are named after the rules in them.
+    rules = getattr(rule, "rules", None)
+    if isinstance(rules, (list, tuple)):
+        return f"{type(rule).__name__}({', '.join(_name(r) for r in rules)})"
+    for attribute in ("__qualname__", "__name__"):
+        name = getattr(rule, attribute, None)
+        if isinstance(name, str):
+            return name
+    # Declarative rules like `Change` are told apart by what they do.
+    if type(rule).__repr__ is not object.__repr__:
+        return repr(rule)
+    return type(rule).__name__
+
+
+def _changed(before: list[t.Any], after: list[t.Any]) -> int:
+    """
+    The number of segments replaced, inserted or deleted to turn one list into the
+    other.
+    """
+    matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+    return sum(
+        max(i2 - i1, j2 - j1)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    )
+
+
+def _caches() -> dict[str, tuple[int, int]]:
+    """
+    Hits and misses of every cache in washitsu so far.
+    """
+    import washitsu
+    from washitsu.cache import CACHES
+
+    output = {name: (cache.hits, cache.misses) for name, cache in CACHES.items()}
+    info = washitsu._renderer().render.cache_info()
+    output["render"] = (info.hits, info.misses)
+    return output
+
+
+class Stats:
+    """
+    Per rule timings and counts, and the cache hits and misses since the stats
+    were made. Rules are told apart by name, or by repr for rules without a name
+    like `Change`, so rules rebuilt for every word are counted together.
+
+    Rules applied to many words at once, like a `Change` run by `Batch` or fused
+    rules run by `Lexicon.then`, are recorded with `record` as one call per word
+    taking an equal share of the time.
+    """
+
+    def __init__(self) -> None:
+        self.rules: dict[str, RuleStats] = {}
+        self._caches = _caches()
+
+    def call(self, rule: t.Callable[[t.Any], t.Any], word: t.Any) -> t.Any:
+        start = time.perf_counter()
+        output = rule(word)
+        elapsed = time.perf_counter() - start
+
+        before = word.flatten()
+        changed = 0 if output is word else _changed(before, output.flatten())
+        self.record(rule, elapsed, 1, len(before), changed)
+        return output
+
+    def record(
+        self,
+        rule: t.Any,
+        seconds: float,
+        calls: int,
+        visited: int,
+        changed: int,
+    ) -> None:
+        """
+        Record `calls` words given to a rule, taking `seconds` in total.
+        """
+        name = _name(rule)
+        try:
+            stats = self.rules[name]
+        except KeyError:
+            stats = self.rules[name] = RuleStats(name)
+
+        stats.calls += calls
+        stats.seconds += seconds
+        if calls:
+            stats.max_seconds = max(stats.max_seconds, seconds / calls)
+        stats.visited += visited
+        stats.changed += changed
+
+    def caches(self) -> dict[str, dict[str, t.Any]]:
+        output = {}
+        for name, (hits, misses) in _caches().items():
+            old_hits, old_misses = self._caches.get(name, (0, 0))
+            hits -= old_hits
+            misses -= old_misses
+            output[name] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else None,
+            }
+        return output
+
+    def as_dict(self) -> dict[str, t.Any]:
+        return {
+            "rules": [stats.as_dict() for stats in self.rules.values()],
+            "caches": self.caches(),
+        }
+
+    def to_json(self, path: str | None = None) -> str:
+        import json
+
+        output = json.dumps(self.as_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(output)
+        return output
+
+    def report(self) -> str:
+        """
+        A table of the rules, slowest first, and the caches.
+        """
+        lines = [
+            f"{'rule':32}{'calls':>10}{'total ms':>12}{'max ms':>10}"
+            f"{'visited':>12}{'changed':>12}"
+        ]
+        for stats in sorted(self.rules.values(), key=lambda s: -s.seconds):
+            lines.append(
+                f"{stats.name[:31]:32}{stats.calls:>10}"
+                f"{stats.seconds * 1000:>12.2f}{stats.max_seconds * 1000:>10.3f}"
+                f"{stats.visited:>12}{stats.changed:>12}"
+            )
+        lines.append("")
+        lines.append(f"{'cache':32}{'hits':>10}{'misses':>12}{'hit rate':>10}")
+        for name, info in self.caches().items():
+            rate = "" if info["hit_rate"] is None else f"{info['hit_rate']:.1%}"
+            lines.append(f"{name:32}{info['hits']:>10}{info['misses']:>12}{rate:>10}")
+        return "\n".join(lines)
+
+
+def enable() -> Stats:
+    """
+    Start recording into new stats.
+    """
+    global active
+    active = Stats()
+    return active
+
+
+def disable() -> Stats | None:
+    """
+    Stop recording, returning what was recorded.
+    """
+    global active
+    stats, active = active, None
+    return stats
+
+
+@contextlib.contextmanager
+def instrumented() -> t.Iterator[Stats]:
+    """
+    Record rules applied inside a `with` block:
+
+    ```py
+    with instrumented() as stats:
+        word.then(umlaut).then(rhoticization)
+    print(stats.report())
+    ```
+    """
+    global active
+    previous = active
+    stats = active = Stats()
+    try:
+        yield stats
+    finally:
+        active = previous
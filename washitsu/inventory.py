@@ -0,0 +1,340 @@
+from __future__ import annotations
+import bisect
+import mmap
+import struct
+import typing as t
+
+from washitsu import (
+    FEATURES,
+    Feature,
+    HigherOrderFunction,
+    Renderer,
+    Segment,
+    _diacritics,
+    _longest_match,
+    _trie,
+    normalize,
+)
+
+__all__ = ["Inventory", "read_table", "compile_table"]
+
+MAGIC = b"WSIV"
+VERSION = 1
+
+# magic, version, features, segments, words per mask, longest symbol
+_HEADER = struct.Struct("<4sIIIII")
+
+
+def _feature(name: str) -> Feature:
+    """
+    The feature with this name, registering a new one if there is none.
+    """
+    for feature in FEATURES:
+        if feature.name == name:
+            return feature
+    return Feature(name)
+
+
+def read_table(
+    lines: t.Iterable[str],
+) -> tuple[list[str], list[tuple[str, list[bool]]]]:
+    """
+    Read a tab separated feature table. The first row names the features after a
+    column for the symbol, and each further row is a symbol followed by `+` for
+    every feature it has. Any other value (`-`, `0`, empty) means it does not have
+    the feature. Blank lines and lines starting with `#` are skipped.
+    """
+    header: list[str] | None = None
+    rows = []
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if not line.strip() or line.startswith("#"):
+            continue
+        cells = line.split("\t")
+        if header is None:
+            header = [cell.strip() for cell in cells[1:]]
+            continue
+        if len(cells) - 1 > len(header):
+            raise Exception(f"Line {number} has more columns than the header")
+        values = [cell.strip() == "+" for cell in cells[1:]]
+        values += [False] * (len(header) - len(values))
+        rows.append((normalize(cells[0].strip()), values))
+
+    if header is None:
+        raise Exception("Feature table is empty")
+    return header, rows
+
+
+def _pad(data: bytearray) -> None:
+    data += bytes(-len(data) % 8)
+
+
+def _strings(data: bytearray, strings: list[bytes]) -> None:
+    offsets = [0]
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    data += struct.pack(f"<{len(offsets)}I", *offsets)
+    data += b"".join(strings)
+    _pad(data)
+
+
+def compile_table(lines: t.Iterable[str]) -> bytes:
+    """
+    Compile a feature table to the binary format read by `Inventory`.
+
+    All integers are little endian. After the header come the feature names and
+    the symbols, each as offsets into a block of UTF-8; the symbol order sorted by
+    encoded symbol, for binary search; one mask per segment as 64 bit words with
+    bit `i` for feature `i` of the table; and one bit set per feature over the
+    segments, for natural class queries. Every section starts on an 8 byte boundary.
+    """
+    names, rows = read_table(lines)
+    symbols = [symbol.encode() for symbol, _ in rows]
+    words = max(1, -(-len(names) // 64))
+    span = max(1, -(-len(rows) // 64))
+
+    data = bytearray(
+        _HEADER.pack(
+            MAGIC,
+            VERSION,
+            len(names),
+            len(rows),
+            words,
+            max((len(symbol) for symbol, _ in rows), default=0),
+        )
+    )
+    _pad(data)
+    _strings(data, [name.encode() for name in names])
+    _strings(data, symbols)
+
+    order = sorted(range(len(rows)), key=symbols.__getitem__)
+    data += struct.pack(f"<{len(order)}I", *order)
+    _pad(data)
+
+    planes = [0] * len(names)
+    for position, (_, values) in enumerate(rows):
+        mask = 0
+        for index, value in enumerate(values):
+            if value:
+                mask |= 1 << index
+                planes[index] |= 1 << position
+        data += mask.to_bytes(8 * words, "little")
+    for plane in planes:
+        data += plane.to_bytes(8 * span, "little")
+    return bytes(data)
+
+
+class Inventory:
+    """
+    A segment inventory in the binary format made by `compile_table`.
+
+    `Inventory.load` maps the file instead of reading it, so processes that load
+    the same file share one copy, and segments are only built when they are used.
+    Symbols are found by binary search, and natural classes are found by combining
+    the bit set of each feature instead of testing every segment.
+
+    Feature names in the file are matched to `Feature`s by name. Names that are not
+    known yet become new features.
+    """
+
+    def __init__(self, data: bytes | mmap.mmap) -> None:
+        self.data = data
+        view = memoryview(data)
+        magic, version, features, segments, words, longest = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise Exception("Not a washitsu inventory")
+        self.words = words
+        self.longest = longest
+        self.size = segments
+        self.span = max(1, -(-segments // 64))
+
+        position = _HEADER.size + -_HEADER.size % 8
+        offsets, blob, position = self._strings(view, position, features)
+        self.features = [
+            _feature(bytes(blob[offsets[i] : offsets[i + 1]]).decode())
+            for i in range(features)
+        ]
+        self._offsets, self._blob, position = self._strings(view, position, segments)
+        self._order = view[position : position + 4 * segments].cast("I")
+        position += 4 * segments + (-4 * segments) % 8
+        self._masks = view[position : position + 8 * words * segments]
+        position += 8 * words * segments
+        self._planes = view[position : position + 8 * self.span * features]
+
+        # Bits of features in the file are only the same as `Feature.mask` when the
+        # features were registered in the same order.
+        self._identity = all(f.index == i for i, f in enumerate(self.features))
+        self._segments: dict[int, Segment] = {}
+        self._renderer: Renderer | None = None
+        self._diacritic_trie: dict | None = None
+
+    @staticmethod
+    def _strings(view: memoryview, position: int, count: int) -> tuple:
+        offsets = view[position : position + 4 * (count + 1)].cast("I")
+        position += 4 * (count + 1)
+        blob = view[position : position + offsets[count]]
+        position += offsets[count]
+        return offsets, blob, position + -position % 8
+
+    @classmethod
+    def load(cls, path: str) -> Inventory:
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_table(cls, path: str) -> Inventory:
+        with open(path, encoding="utf-8") as f:
+            return cls(compile_table(f))
+
+    @staticmethod
+    def compile(table: str, output: str) -> None:
+        """
+        Compile the feature table at `table` into a file for `Inventory.load`.
+        """
+        with open(table, encoding="utf-8") as f:
+            data = compile_table(f)
+        with open(output, "wb") as f:
+            f.write(data)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> t.Iterator[Segment]:
+        for index in range(self.size):
+            yield self[index]
+
+    def __getitem__(self, index: int) -> Segment:
+        try:
+            return self._segments[index]
+        except KeyError:
+            pass
+        if not 0 <= index < self.size:
+            raise IndexError("Inventory index out of range")
+        segment = Segment(self.symbol(index), self.mask(index))
+        self._segments[index] = segment
+        return segment
+
+    def __repr__(self):
+        return f"Inventory({self.size} segments, {len(self.features)} features)"
+
+    def _symbol(self, index: int) -> bytes:
+        return bytes(self._blob[self._offsets[index] : self._offsets[index + 1]])
+
+    def symbol(self, index: int) -> str:
+        return self._symbol(index).decode()
+
+    def mask(self, index: int) -> int:
+        """
+        The feature mask of a segment, with the bits of `Feature.mask`.
+        """
+        start = 8 * self.words * index
+        mask = int.from_bytes(self._masks[start : start + 8 * self.words], "little")
+        if self._identity:
+            return mask
+        output = 0
+        for feature in self.features:
+            if mask & 1:
+                output |= feature.mask
+            mask >>= 1
+        return output
+
+    def index(self, symbol: str) -> int | None:
+        """
+        The position of a symbol in the inventory, or None if it is not there.
+        """
+        key = normalize(symbol).encode()
+        order = self._order
+        position = bisect.bisect_left(
+            range(self.size), key, key=lambda i: self._symbol(order[i])
+        )
+        if position < self.size and self._symbol(order[position]) == key:
+            return order[position]
+        return None
+
+    def find(self, symbol: str) -> Segment:
+        index = self.index(symbol)
+        if index is None:
+            raise Exception(f"Can not find segment: {symbol}")
+        return self[index]
+
+    def tokenize(self, string: str) -> list[Segment]:
+        """
+        Split an IPA string into segments: the longest symbol in the inventory at
+        each position, followed by any diacritics.
+        """
+        if self._diacritic_trie is None:
+            self._diacritic_trie = _trie(
+                {normalize(d.ipa_symbol): d for d in reversed(_diacritics())}
+            )
+
+        string = normalize(string)
+        output: list[Segment] = []
+        start = 0
+        while start < len(string):
+            for end in range(min(len(string), start + self.longest), start, -1):
+                index = self.index(string[start:end])
+                if index is not None:
+                    break
+            else:
+                raise Exception(f"Can not find segment: {string[start:]}")
+
+            segment = self[index]
+            while end < len(string):
+                diacritic, diacritic_end = _longest_match(
+                    self._diacritic_trie, string, end
+                )
+                if diacritic is None:
+                    break
+                segment = Segment(
+                    segment.ipa_symbol + diacritic.ipa_symbol,
+                    segment.mask | diacritic.mask,
+                )
+                end = diacritic_end
+
+            output.append(segment)
+            start = end
+        return output
+
+    def render(self, segment: Segment | int) -> str:
+        """
+        IPA for a segment or feature mask, written with the nearest segment in
+        this inventory.
+        """
+        if self._renderer is None:
+            self._renderer = Renderer(list(self), _diacritics())
+        mask = segment if isinstance(segment, int) else segment.mask
+        return self._renderer.render(mask)
+
+    def _plane(self, position: int) -> int:
+        start = 8 * self.span * position
+        return int.from_bytes(self._planes[start : start + 8 * self.span], "little")
+
+    def natural_class(self, predicate: HigherOrderFunction) -> list[Segment]:
+        """
+        Every segment matching a predicate, in inventory order.
+        """
+        terms = predicate.terms()
+        if terms is None:
+            return [segment for segment in self if predicate(segment.mask)]
+
+        positions = {feature.index: i for i, feature in enumerate(self.features)}
+        everything = (1 << self.size) - 1
+        matched = 0
+        for required, forbidden in terms:
+            plane = everything
+            for feature in FEATURES:
+                if required & feature.mask:
+                    if feature.index not in positions:
+                        plane = 0
+                        break
+                    plane &= self._plane(positions[feature.index])
+                elif forbidden & feature.mask and feature.index in positions:
+                    plane &= ~self._plane(positions[feature.index])
+            matched |= plane
+
+        output = []
+        while matched:
+            low = matched & -matched
+            output.append(self[low.bit_length() - 1])
+            matched ^= low
+        return output
@@ -0,0 +1,419 @@
+from __future__ import annotations
+from array import array
+import bisect
+from collections import Counter
+import time
+import typing as t
+
+from washitsu import instrument
+from washitsu import (
+    FEATURES,
+    INTERNED,
+    Chain,
+    FusedRule,
+    HigherOrderFunction,
+    Segment,
+    Syllable,
+    Word,
+)
+from washitsu.batch import Batch, Change
+
+__all__ = ["Lexicon"]
+
+
+class Lexicon:
+    """
+    Many words stored as packed arrays instead of `Word` objects.
+
+    `segments` holds the `Segment.id` of every segment of every word back to back.
+    `bounds` holds three entries per syllable: the positions where its onset,
+    nucleus and coda end. A syllable starts where the previous one ends.
+    `words` holds the index of the first syllable of each word, plus one entry
+    past the last word.
+
+    Indexing a lexicon builds a `Word`; slicing builds a smaller `Lexicon`.
+
+    `postings()` is an inverted index from segment id to the words containing that
+    segment. It is built the first time it is needed and carried over to the
+    lexicons made by `then`, updating only the words a rule rewrote.
+    """
+
+    def __init__(self, words: t.Iterable[Word] = ()) -> None:
+        self.segments = array("I")
+        self.bounds = array("I")
+        self.words = array("I", [0])
+        self._postings: dict[int, set[int]] | None = None
+        self.extend(words)
+
+    def append(self, word: Word) -> None:
+        self._postings = None
+        for syllable in word.syllables:
+            for part in (syllable.onset, syllable.nucleus, syllable.coda):
+                self.segments.extend(segment.id for segment in part)
+                self.bounds.append(len(self.segments))
+        self.words.append(len(self.bounds) // 3)
+
+    def extend(self, words: t.Iterable[Word]) -> None:
+        self._postings = None
+        for word in words:
+            self.append(word)
+
+    def __len__(self) -> int:
+        return len(self.words) - 1
+
+    def __iter__(self) -> t.Iterator[Word]:
+        for index in range(len(self)):
+            yield self._word(index)
+
+    @t.overload
+    def __getitem__(self, index: int) -> Word: ...
+
+    @t.overload
+    def __getitem__(self, index: slice) -> Lexicon: ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return Lexicon(self._word(i) for i in range(start, stop, step))
+            return self._slice(start, max(start, stop))
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Lexicon index out of range")
+        return self._word(index)
+
+    def __repr__(self):
+        return f"Lexicon({len(self)} words, {len(self.segments)} segments)"
+
+    def __getstate__(self):
+        # Segment ids are only meaningful in the process that made them, so the
+        # segments are stored once each and the ids are replaced by indices.
+        table = {id: index for index, id in enumerate(dict.fromkeys(self.segments))}
+        return {
+            "table": [INTERNED[id] for id in table],
+            "segments": array("I", map(table.__getitem__, self.segments)),
+            "bounds": self.bounds,
+            "words": self.words,
+        }
+
+    def __setstate__(self, state):
+        ids = [segment.id for segment in state["table"]]
+        self.segments = array("I", map(ids.__getitem__, state["segments"]))
+        self.bounds = state["bounds"]
+        self.words = state["words"]
+        self._postings = None
+
+    def _start(self, syllable: int) -> int:
+        """
+        The position of the first segment of a syllable.
+        """
+        return self.bounds[3 * syllable - 1] if syllable else 0
+
+    def _range(self, index: int) -> tuple[int, int]:
+        """
+        The positions of the first segment of a word and one past its last.
+        """
+        return self._start(self.words[index]), self._start(self.words[index + 1])
+
+    def postings(self) -> dict[int, set[int]]:
+        """
+        For every segment id in the lexicon, the indices of the words containing it.
+        """
+        if self._postings is None:
+            postings: dict[int, set[int]] = {}
+            for index in range(len(self)):
+                start, end = self._range(index)
+                for id in set(self.segments[start:end]):
+                    postings.setdefault(id, set()).add(index)
+            self._postings = postings
+        return self._postings
+
+    def candidates(self, predicate: HigherOrderFunction) -> list[int]:
+        """
+        The indices of the words with a segment matching `predicate`, in order.
+        Passing a `Feature` gives the words with a segment that has it.
+        """
+        output: set[int] = set()
+        for id, indices in self.postings().items():
+            if predicate(INTERNED[id].mask):
+                output |= indices
+        return sorted(output)
+
+    def _copy(self, output: Lexicon, first: int, last: int) -> None:
+        """
+        Append the words from `first` up to `last` to another lexicon.
+        """
+        if first == last:
+            return
+        syllables = len(output.bounds) // 3
+        start, end = self.words[first], self.words[last]
+        offset = len(output.segments) - self._start(start)
+        output.segments += self.segments[self._start(start) : self._start(end)]
+        bounds = self.bounds[3 * start : 3 * end]
+        words = self.words[first + 1 : last + 1]
+        # Words before any change in length keep their positions.
+        output.bounds += (
+            bounds if offset == 0 else array("I", (b + offset for b in bounds))
+        )
+        output.words += (
+            words
+            if syllables == start
+            else array("I", (w - start + syllables for w in words))
+        )
+
+    def _replace(self, words: dict[int, Word]) -> Lexicon:
+        """
+        A lexicon with some words replaced. The other words are copied over as
+        slices of the packed arrays, and the index is updated for the new words.
+        """
+        if not words:
+            return self
+
+        output = Lexicon()
+        last = 0
+        for index in sorted(words):
+            self._copy(output, last, index)
+            output.append(words[index])
+            last = index + 1
+        self._copy(output, last, len(self))
+        self._update(output, words)
+        return output
+
+    def _update(self, output: Lexicon, indices: t.Iterable[int]) -> None:
+        """
+        Carry the index over to a lexicon that differs from this one only in the
+        words at `indices`. The sets of the other words are shared, not copied.
+        """
+        if self._postings is None:
+            return
+
+        postings = dict(self._postings)
+        copied: set[int] = set()
+
+        def edit(id: int) -> set[int]:
+            if id not in copied:
+                postings[id] = set(postings.get(id, ()))
+                copied.add(id)
+            return postings[id]
+
+        for index in indices:
+            start, end = self._range(index)
+            for id in set(self.segments[start:end]):
+                edit(id).discard(index)
+            start, end = output._range(index)
+            for id in set(output.segments[start:end]):
+                edit(id).add(index)
+        output._postings = {id: s for id, s in postings.items() if s}
+
+    def key(self, index: int) -> bytes:
+        """
+        The segment feature masks and syllable bounds of a word as bytes. Two words
+        of a lexicon have the same key when they are equal.
+        """
+        first, last = self.words[index], self.words[index + 1]
+        start, end = self._range(index)
+        bounds = array("I", (b - start for b in self.bounds[3 * first : 3 * last]))
+        width = max(1, -(-len(FEATURES) // 8))
+        masks = b"".join(
+            INTERNED[id].mask.to_bytes(width, "little")
+            for id in self.segments[start:end]
+        )
+        return len(bounds).to_bytes(4, "little") + bounds.tobytes() + masks
+
+    def dedupe(self) -> Lexicon:
+        """
+        The lexicon without repeated words, keeping the first of each.
+        """
+        seen: set[bytes] = set()
+        output = Lexicon()
+        last = 0
+        for index in range(len(self)):
+            key = self.key(index)
+            if key in seen:
+                self._copy(output, last, index)
+                last = index + 1
+            else:
+                seen.add(key)
+        if last == 0:
+            return self
+        self._copy(output, last, len(self))
+        return output
+
+    def mergers(self, *rules: t.Callable[[Word], Word]) -> dict[Word, list[Word]]:
+        """
+        Apply rules and find the words that became the same: each result that two
+        or more different words turned into, with those words in lexicon order.
+        """
+        unique = self.dedupe()
+        output = unique.then(*rules)
+        groups: dict[bytes, list[int]] = {}
+        for index in range(len(output)):
+            groups.setdefault(output.key(index), []).append(index)
+        return {
+            output._word(indices[0]): [unique._word(i) for i in indices]
+            for indices in groups.values()
+            if len(indices) > 1
+        }
+
+    def _word(self, index: int) -> Word:
+        first, last = self.words[index], self.words[index + 1]
+        position = self._start(first)
+        syllables = []
+        for syllable in range(first, last):
+            parts = []
+            for end in self.bounds[3 * syllable : 3 * syllable + 3]:
+                parts.append([INTERNED[id] for id in self.segments[position:end]])
+                position = end
+            syllables.append(Syllable(*parts))
+        return Word(syllables)
+
+    def _slice(self, start: int, stop: int) -> Lexicon:
+        first, last = self.words[start], self.words[stop]
+        offset = self._start(first)
+
+        output = Lexicon()
+        output.segments = self.segments[offset : self._start(last)]
+        output.bounds = array(
+            "I", (b - offset for b in self.bounds[3 * first : 3 * last])
+        )
+        output.words = array("I", (w - first for w in self.words[start : stop + 1]))
+        return output
+
+    def _with_segments(self, segments: array) -> Lexicon:
+        """
+        A lexicon with the same word and syllable structure but different segments.
+        The structure is copied, since either lexicon can be appended to later.
+        """
+        output = Lexicon()
+        output.segments = segments
+        output.bounds = array("I", self.bounds)
+        output.words = array("I", self.words)
+        return output
+
+    def _batch(self) -> Batch:
+        segments: list[Segment | None] = []
+        starts: list[int] = []
+        for index in range(len(self)):
+            segments.append(None)
+            starts.append(len(segments))
+            start, end = self._range(index)
+            segments += [INTERNED[id] for id in self.segments[start:end]]
+        batch = Batch(segments)
+        batch._starts = starts
+        return batch
+
+    def then(self, *rules: t.Callable[[Word], Word]) -> Lexicon:
+        """
+        Apply rules to every word. Runs of vectorizable `Change`s and of context
+        free rules are applied to the packed segments directly. Any other rule is
+        applied word by word, only to the words with a segment matching its
+        `trigger` if it has one, and only the words it changed are stored again.
+        """
+        stats = instrument.active
+        lexicon = self
+        batch: Batch | None = None
+        for rule in Chain(*rules).steps:
+            if isinstance(rule, Change) and rule.vectorizable():
+                if batch is None:
+                    batch = lexicon._batch()
+                start = time.perf_counter()
+                changed = batch.apply(rule)
+                if stats is not None:
+                    elapsed = time.perf_counter() - start
+                    words, visited = len(lexicon), len(lexicon.segments)
+                    stats.record(rule, elapsed, words, visited, changed)
+                continue
+
+            if batch is not None:
+                lexicon = lexicon._from_batch(batch)
+                batch = None
+            if isinstance(rule, FusedRule):
+                start = time.perf_counter()
+                table = lexicon._table(rule)
+                output = lexicon._map(table)
+                if stats is not None:
+                    elapsed = time.perf_counter() - start
+                    counts = Counter(lexicon.segments)
+                    changed = sum(
+                        counts[id] * max(len(ids), 1)
+                        for id, ids in table.items()
+                        if ids != [id]
+                    )
+                    words, visited = len(lexicon), len(lexicon.segments)
+                    stats.record(rule, elapsed, words, visited, changed)
+                lexicon = output
+                continue
+
+            trigger = getattr(rule, "trigger", None)
+            if trigger is None:
+                indices: t.Iterable[int] = range(len(lexicon))
+            else:
+                indices = lexicon.candidates(trigger)
+            changed = {}
+            for index in indices:
+                word = lexicon._word(index)
+                output = word.then(rule)
+                if output is not word:
+                    changed[index] = output
+            lexicon = lexicon._replace(changed)
+
+        if batch is not None:
+            lexicon = lexicon._from_batch(batch)
+        return lexicon
+
+    def _table(self, rule: FusedRule) -> dict[int, list[int]]:
+        """
+        What a fused rule turns each segment of the lexicon into, by id.
+        """
+        return {
+            id: [s.id for s in rule.map(INTERNED[id])] for id in set(self.segments)
+        }
+
+    def _map(self, table: dict[int, list[int]]) -> Lexicon:
+        """
+        The lexicon with every segment replaced by the segments `table` gives for
+        its id. The index is carried over: a word has a new segment exactly when
+        it had a segment that became it.
+        """
+        if all(len(ids) == 1 for ids in table.values()):
+            single = {id: ids[0] for id, ids in table.items()}
+            output = self._with_segments(
+                array("I", map(single.__getitem__, self.segments))
+            )
+        else:
+            output = Lexicon()
+            output.words = array("I", self.words)
+            position = 0
+            for end in self.bounds:
+                for id in self.segments[position:end]:
+                    output.segments.extend(table[id])
+                output.bounds.append(len(output.segments))
+                position = end
+
+        if self._postings is not None:
+            postings: dict[int, set[int]] = {}
+            for id, indices in self._postings.items():
+                for new in table[id]:
+                    if new in postings:
+                        postings[new] = postings[new] | indices
+                    else:
+                        postings[new] = indices
+            output._postings = postings
+        return output
+
+    def _from_batch(self, batch: Batch) -> Lexicon:
+        if not batch.changed:
+            return self
+        output = self._with_segments(
+            array("I", [s.id for s in batch.segments if s is not None])
+        )
+        self._update(
+            output,
+            {
+                bisect.bisect_right(batch._starts, position) - 1
+                for position in batch.changed
+            },
+        )
+        return output
@@ -0,0 +1,55 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+import os
+import typing as t
+
+from washitsu import Chain, Word, chain
+from washitsu.lexicon import Lexicon
+
+__all__ = ["evolve"]
+
+# The rules of the current worker, set once when the worker starts.
+_rules: Chain | None = None
+
+
+def _initialize(rules: tuple[t.Callable[[Word], Word], ...]) -> None:
+    global _rules
+    _rules = chain(*rules)
+
+
+def _evolve(lexicon: Lexicon) -> Lexicon:
+    return lexicon.then(_rules)
+
+
+def evolve(
+    words: t.Iterable[Word],
+    *rules: t.Callable[[Word], Word],
+    processes: int | None = None,
+    chunksize: int = 1024,
+) -> list[Word]:
+    """
+    Apply rules to every word using a pool of processes. Words are sent to the
+    workers in chunks of `chunksize` as a `Lexicon` and come back in order.
+
+    Rules and predicates are pickled, so rules must be importable by name or be
+    built from picklable parts: a `Rule`, a `Change`, or a function defined at the
+    top level of a module. With `processes=1` everything runs in this process.
+    """
+    lexicon = Lexicon(words)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes <= 1 or len(lexicon) <= chunksize:
+        return list(lexicon.then(*rules))
+
+    chunks = [
+        lexicon[start : start + chunksize]
+        for start in range(0, len(lexicon), chunksize)
+    ]
+    output: list[Word] = []
+    with ProcessPoolExecutor(
+        processes, initializer=_initialize, initargs=(rules,)
+    ) as executor:
+        for chunk in executor.map(_evolve, chunks):
+            output.extend(chunk)
+    return output
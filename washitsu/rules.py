@@ -2,30 +2,37 @@ from __future__ import annotations
 from washitsu import *
 
 obstruent = -sonorant
+voiced_obstruent = voiced & consonantal & obstruent
+voiceless_obstruent = -voiced & consonantal & obstruent
+consonantal_obstruent = consonantal & obstruent
+voiced_vocoid = voiced & -consonantal
+close_front = close & front
 
 
+@trigger(consonantal_obstruent)
 @each_segment
 def voicing_assim(word: Word, segment: Segment) -> Segment:
-    if word.matches(segment, [voiced & consonantal & obstruent]) and segment.has(
-        consonantal & obstruent
-    ):
+    if word.matches(segment, [voiced_obstruent]) and segment.has(consonantal_obstruent):
         return segment + voiced
-    if word.matches(segment, [-voiced & consonantal & obstruent]) and segment.has(
-        consonantal & obstruent
+    if word.matches(segment, [voiceless_obstruent]) and segment.has(
+        consonantal_obstruent
     ):
         return segment - voiced
     return segment
 
 
+@trigger(consonantal_obstruent)
 @each_segment
 def intervocalic_voicing(word: Word, segment: Segment) -> Segment:
-    if word.matches(
-        [voiced & -consonantal], segment, [voiced & -consonantal]
-    ) and segment.has(consonantal & obstruent):
+    if word.matches([voiced_vocoid], segment, [voiced_vocoid]) and segment.has(
+        consonantal_obstruent
+    ):
         return segment + voiced
     return segment
 
 
+@trigger(select("z"))
+@context_free
 @each_segment
 def rhoticization(word: Word, segment: Segment) -> Segment:
     if segment.has(select("z")):
@@ -33,6 +40,8 @@ def rhoticization(word: Word, segment: Segment) -> Segment:
     return segment
 
 
+@trigger(select("i") | select("u") | select("e") | select("o") | select("a"))
+@context_free
 @each_segment
 def gnarsh_chain_shift(word: Word, segment: Segment) -> Segment:
     if segment.has(select("i")):
@@ -48,13 +57,16 @@ def gnarsh_chain_shift(word: Word, segment: Segment) -> Segment:
     return segment
 
 
+@trigger(close_front)
 @each_segment
 def umlaut(word: Word, segment: Segment) -> Segment:
-    if word.includes_before(segment, close & front) and segment.has(back):
+    if word.includes_before(segment, close_front) and segment.has(back):
         return segment - back + front
     return segment
 
 
+@trigger(close | close_mid)
+@context_free
 @each_segment
 def great_vowel_shift(word: Word, segment: Segment) -> Segment:
     if segment.has(close):
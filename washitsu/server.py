@@ -0,0 +1,441 @@
+from __future__ import annotations
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import itertools
+import json
+import typing as t
+
+import washitsu
+from washitsu import SyllableTemplate, Word, chain, syllabic, tokenizer
+from washitsu.cli import default_template, load
+from washitsu.generate import Generator
+from washitsu.lexicon import Lexicon
+
+__all__ = ["Server", "Client", "main"]
+
+
+@functools.cache
+def _rules(names: tuple[str, ...]):
+    return chain(*(load(name) for name in names))
+
+
+@functools.cache
+def _template(name: str | None) -> SyllableTemplate:
+    return load(name) if name else default_template()
+
+
+@functools.cache
+def _generator(name: str | None) -> Generator:
+    if name:
+        return load(name)
+    return Generator(
+        washitsu.SEGMENTS, [(-syllabic, 0.8)], [syllabic], [(-syllabic, 0.3)]
+    )
+
+
+async def _failed(error: Exception) -> dict:
+    raise error
+
+
+async def _readline(reader: asyncio.StreamReader) -> bytes | None:
+    """
+    The next line, `b""` at the end of the stream, or None for a line longer than
+    the limit of the reader, which is skipped.
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as error:
+        return error.partial
+    except asyncio.LimitOverrunError as error:
+        consumed = error.consumed
+    while True:
+        try:
+            await reader.readexactly(consumed)
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as error:
+            consumed = error.consumed
+
+
+class _Job(t.NamedTuple):
+    rules: tuple[str, ...]
+    template: str | None
+    words: list[str]
+    future: asyncio.Future
+
+
+class Server:
+    """
+    A local server that keeps inventories, templates and rule chains loaded.
+
+    Clients send one JSON object per line and get one back per line, with the same
+    `id`. The operations are:
+    - `{"op": "evolve", "words": [...], "rules": ["module:attribute", ...]}`, with
+      an optional `"template"`, returns `{"words": [...]}` rendered
+    - `{"op": "generate", "count": n, "syllables": [low, high], "seed": s}`, with
+      an optional `"generator"`, returns `{"words": [...]}`
+    - `{"op": "ping"}` returns `{"ok": true}`
+
+    Evolve requests that arrive within `delay` seconds of each other are applied
+    as one `Lexicon`, up to `batch` words. At most `queue` evolve requests wait
+    at once, and at most `queue` generate requests are waiting or running; past
+    that the server stops reading from connections until there is room.
+
+    A line longer than `limit` bytes, by default 1 KiB per word of a batch, is
+    answered with an error without an id and ends the connection once the
+    requests before it are answered.
+    """
+
+    def __init__(
+        self,
+        batch: int = 4096,
+        delay: float = 0.005,
+        queue: int = 256,
+        limit: int | None = None,
+    ):
+        self.batch = batch
+        self.delay = delay
+        self.limit = limit or batch * 1024
+        self.queue: asyncio.Queue[_Job] = asyncio.Queue(queue)
+        self.generating = asyncio.Semaphore(queue)
+        # Rules and caches are not thread safe, so all work runs on one thread.
+        self.executor = ThreadPoolExecutor(1)
+        self._batcher: asyncio.Task | None = None
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0, path: str | None = None
+    ) -> asyncio.AbstractServer:
+        if self._batcher is None:
+            self._batcher = asyncio.create_task(self._batches())
+        if path is not None:
+            return await asyncio.start_unix_server(
+                self._connection, path, limit=self.limit
+            )
+        return await asyncio.start_server(
+            self._connection, host, port, limit=self.limit
+        )
+
+    async def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        self.executor.shutdown(wait=False)
+
+    async def _connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        lock = asyncio.Lock()
+        pending: set[asyncio.Task] = set()
+
+        async def respond(id: t.Any, response: t.Awaitable[dict]) -> None:
+            try:
+                output = await response
+            except Exception as error:
+                output = {"error": str(error)}
+            output["id"] = id
+            async with lock:
+                writer.write(json.dumps(output, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while (line := await _readline(reader)) != b"":
+                if line is None:
+                    # The id of the request is lost with the line, so the client
+                    # can not tell which request failed and the connection ends.
+                    error = ValueError(f"Request is longer than {self.limit} bytes")
+                    pending.add(asyncio.create_task(respond(None, _failed(error))))
+                    break
+                request: dict = {}
+                try:
+                    parsed = json.loads(line)
+                    if not isinstance(parsed, dict):
+                        raise ValueError("Expected a JSON object")
+                    request = parsed
+                    if request.get("op") == "evolve":
+                        # The words are queued before the next line is read, so a
+                        # full queue holds the connection back.
+                        job = self._job(request)
+                        await self.queue.put(job)
+                        response = self._evolved(job)
+                    elif request.get("op") == "generate":
+                        await self.generating.acquire()
+                        response = self._released(self.handle(request))
+                    else:
+                        response = self.handle(request)
+                except ValueError as error:
+                    response = _failed(error)
+                task = asyncio.create_task(respond(request.get("id"), response))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+        finally:
+            writer.close()
+
+    def _job(self, request: dict) -> _Job:
+        words = request.get("words", [])
+        if not isinstance(words, list) or not all(isinstance(w, str) for w in words):
+            raise ValueError("Expected a list of words")
+        rules = request.get("rules", [])
+        if not isinstance(rules, list) or not all(isinstance(r, str) for r in rules):
+            raise ValueError("Expected a list of rule names")
+        template = request.get("template")
+        if template is not None and not isinstance(template, str):
+            raise ValueError("Expected a template name")
+        return _Job(
+            tuple(rules),
+            template,
+            words,
+            asyncio.get_running_loop().create_future(),
+        )
+
+    async def _evolved(self, job: _Job) -> dict:
+        return {"words": await job.future}
+
+    async def _released(self, response: t.Awaitable[dict]) -> dict:
+        try:
+            return await response
+        finally:
+            self.generating.release()
+
+    async def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True}
+        if op == "evolve":
+            job = self._job(request)
+            await self.queue.put(job)
+            return await self._evolved(job)
+        if op == "generate":
+            loop = asyncio.get_running_loop()
+            words = await loop.run_in_executor(
+                self.executor,
+                self._generate,
+                request.get("generator"),
+                int(request.get("count", 1)),
+                tuple(request.get("syllables", (1, 1))),
+                request.get("seed"),
+            )
+            return {"words": words}
+        raise Exception(f"Unknown operation: {op}")
+
+    def _generate(
+        self,
+        name: str | None,
+        count: int,
+        syllables: tuple[int, int],
+        seed: int | None,
+    ) -> list[str]:
+        generator = _generator(name)
+        return [word.render() for word in generator.words(count, syllables, seed)]
+
+    async def _batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self.queue.get()]
+            size = len(jobs[0].words)
+            deadline = loop.time() + self.delay
+            while size < self.batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                jobs.append(job)
+                size += len(job.words)
+
+            try:
+                await self._run(jobs)
+            except Exception as error:
+                # Whatever went wrong, the batcher keeps running for later jobs.
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(error)
+
+    async def _run(self, jobs: list[_Job]) -> None:
+        loop = asyncio.get_running_loop()
+        groups: dict[tuple, list[_Job]] = {}
+        for job in jobs:
+            groups.setdefault((job.rules, job.template), []).append(job)
+        for (rules, template), group in groups.items():
+            try:
+                output = await loop.run_in_executor(
+                    self.executor,
+                    self._evolve,
+                    rules,
+                    template,
+                    [job.words for job in group],
+                )
+            except Exception as error:
+                for job in group:
+                    if not job.future.done():
+                        job.future.set_exception(error)
+                continue
+            for job, words in zip(group, output):
+                if job.future.done():
+                    continue
+                if isinstance(words, Exception):
+                    job.future.set_exception(words)
+                else:
+                    job.future.set_result(words)
+
+    def _evolve(
+        self,
+        rules: tuple[str, ...],
+        template: str | None,
+        batches: list[list[str]],
+    ) -> list[list[str] | Exception]:
+        """
+        Apply rules to the words of several requests as one lexicon. Syllable
+        breaks in the input are ignored, since words are syllabified again. A
+        request with a word that can not be read fails without failing the others.
+        """
+        tokens = tokenizer()
+        syllables = _template(template)
+        parsed: list[list[Word] | Exception] = []
+        for words in batches:
+            try:
+                parsed.append(
+                    [
+                        syllables.syllabify(tokens.tokenize(word.replace(".", "")))
+                        for word in words
+                    ]
+                )
+            except Exception as error:
+                parsed.append(error)
+
+        lexicon = Lexicon(
+            word for words in parsed if isinstance(words, list) for word in words
+        )
+        rendered = iter([word.render() for word in lexicon.then(_rules(rules))])
+        return [
+            words if isinstance(words, Exception) else list(
+                itertools.islice(rendered, len(words))
+            )
+            for words in parsed
+        ]
+
+
+class Client:
+    """
+    A connection to a `Server`. Requests can be made concurrently; responses are
+    matched to requests by id. Responses can be up to `limit` bytes long.
+
+    When the connection ends, requests still waiting fail with `ConnectionError`,
+    carrying the last error the server sent without an id if there was one.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._ids = itertools.count()
+        self._waiting: dict[int, asyncio.Future] = {}
+        self._task = asyncio.create_task(self._read())
+
+    @classmethod
+    async def connect(
+        cls,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        path: str | None = None,
+        limit: int = 1 << 24,
+    ) -> Client:
+        if path is not None:
+            return cls(*await asyncio.open_unix_connection(path, limit=limit))
+        return cls(*await asyncio.open_connection(host, port, limit=limit))
+
+    async def _read(self) -> None:
+        error: Exception = ConnectionError("Connection closed")
+        try:
+            while line := await self.reader.readline():
+                response = json.loads(line)
+                if response.get("id") is None and "error" in response:
+                    error = ConnectionError(response["error"])
+                    continue
+                future = self._waiting.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except Exception as exception:
+            error = ConnectionError(f"Connection failed: {exception}")
+        finally:
+            # However reading stops, nothing waits for a response that can not
+            # come.
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._waiting.clear()
+
+    async def request(self, request: dict) -> dict:
+        if self._task.done():
+            raise ConnectionError("Connection closed")
+        id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[id] = future
+        self.writer.write(json.dumps({**request, "id": id}).encode() + b"\n")
+        await self.writer.drain()
+        response = await future
+        if "error" in response:
+            raise Exception(response["error"])
+        return response
+
+    async def ping(self) -> bool:
+        return (await self.request({"op": "ping"}))["ok"]
+
+    async def evolve(
+        self, words: list[str], rules: list[str], template: str | None = None
+    ) -> list[str]:
+        request = {"op": "evolve", "words": words, "rules": rules}
+        if template is not None:
+            request["template"] = template
+        return (await self.request(request))["words"]
+
+    async def generate(
+        self,
+        count: int,
+        syllables: tuple[int, int] = (1, 1),
+        seed: int | None = None,
+        generator: str | None = None,
+    ) -> list[str]:
+        request = {"op": "generate", "count": count, "syllables": list(syllables)}
+        if seed is not None:
+            request["seed"] = seed
+        if generator is not None:
+            request["generator"] = generator
+        return (await self.request(request))["words"]
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+        self._task.cancel()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="washitsu-server",
+        description="Serve word generation and sound changes over a local socket.",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7878)
+    parser.add_argument("--unix", help="listen on a Unix socket at this path")
+    parser.add_argument("--batch", type=int, default=4096)
+    parser.add_argument("--delay", type=float, default=0.005)
+    parser.add_argument("--queue", type=int, default=256)
+    parser.add_argument("--limit", type=int, help="longest request in bytes")
+    args = parser.parse_args(argv)
+
+    async def serve() -> None:
+        server = Server(args.batch, args.delay, args.queue, args.limit)
+        listener = await server.start(args.host, args.port, args.unix)
+        async with listener:
+            await listener.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
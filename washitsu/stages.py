@@ -0,0 +1,271 @@
+from __future__ import annotations
+from array import array
+import hashlib
+import os
+import pickle
+import tempfile
+import types
+import typing as t
+
+from washitsu import (
+    INTERNED,
+    Chain,
+    HigherOrderFunction,
+    ResyllabifyRule,
+    Segment,
+    SegmentRule,
+    Word,
+)
+from washitsu.lexicon import Lexicon
+
+__all__ = ["StageCache", "fingerprint", "identity"]
+
+# Part of every key, so checkpoints from an older format are never read.
+VERSION = b"washitsu-stages-1"
+
+
+def fingerprint(lexicon: Lexicon) -> str:
+    """
+    A hash of the contents of a lexicon that is the same in every process.
+    Segments are hashed by symbol and feature names instead of by id.
+    """
+    digest = hashlib.sha256(VERSION)
+    table = {id: index for index, id in enumerate(dict.fromkeys(lexicon.segments))}
+    for id in table:
+        segment = INTERNED[id]
+        digest.update(segment.ipa_symbol.encode() + b"\0")
+        digest.update(",".join(f.name for f in segment.features).encode() + b"\0")
+    for numbers in (
+        array("I", map(table.__getitem__, lexicon.segments)),
+        lexicon.bounds,
+        lexicon.words,
+    ):
+        digest.update(len(numbers).to_bytes(8, "little"))
+        digest.update(numbers.tobytes())
+    return digest.hexdigest()
+
+
+def _code(code: types.CodeType, digest) -> None:
+    digest.update(code.co_code)
+    digest.update(repr((code.co_names, code.co_varnames)).encode())
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            _code(constant, digest)
+        else:
+            digest.update(repr(constant).encode())
+
+
+class _Unidentifiable(Exception):
+    pass
+
+
+def _data(value: t.Any) -> str | None:
+    """
+    A stable repr of plain data: numbers, strings and containers of them. Sets are
+    sorted, since their order changes between processes.
+    """
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        return repr(value)
+    if isinstance(value, (tuple, list)):
+        items = [_data(item) for item in value]
+        if None in items:
+            return None
+        return f"{type(value).__name__}({', '.join(items)})"
+    if isinstance(value, (set, frozenset)):
+        items = [_data(item) for item in value]
+        if None in items:
+            return None
+        return f"set({', '.join(sorted(items))})"
+    if isinstance(value, dict):
+        items = [(_data(key), _data(item)) for key, item in value.items()]
+        if any(None in pair for pair in items):
+            return None
+        return f"dict({', '.join(f'{key}: {item}' for key, item in items)})"
+    return None
+
+
+def _function(function: types.FunctionType, digest, seen: set[int]) -> None:
+    """
+    Hash the code of a function and the globals it uses that are predicates,
+    segments, plain data or other functions of the same module, so editing a
+    helper or a parameter also changes the identity of the rules that use it.
+    """
+    if id(function) in seen:
+        return
+    seen.add(id(function))
+    _code(function.__code__, digest)
+    digest.update(repr(function.__defaults__).encode())
+    for cell in function.__closure__ or ():
+        _value(cell.cell_contents, function.__module__, digest, seen)
+    for name in function.__code__.co_names:
+        if name in function.__globals__:
+            digest.update(name.encode() + b"=")
+            _value(function.__globals__[name], function.__module__, digest, seen)
+
+
+def _value(value: t.Any, module: str, digest, seen: set[int]) -> None:
+    """
+    Raises `_Unidentifiable` for values that may change without their repr
+    changing, like instances of classes without a repr.
+    """
+    if isinstance(value, (HigherOrderFunction, Segment)):
+        digest.update(repr(value).encode())
+    elif isinstance(value, (SegmentRule, ResyllabifyRule)):
+        _function(value.function, digest, seen)
+    elif isinstance(value, types.FunctionType):
+        if value.__module__ == module:
+            _function(value, digest, seen)
+    elif isinstance(getattr(value, "__wrapped__", None), types.FunctionType):
+        # Functions wrapped by decorators like `functools.cache`.
+        _value(value.__wrapped__, module, digest, seen)
+    elif isinstance(
+        value, (types.ModuleType, type, types.BuiltinFunctionType, types.MethodType)
+    ):
+        pass
+    elif (data := _data(value)) is not None:
+        digest.update(data.encode())
+    elif type(value).__repr__ is not object.__repr__:
+        digest.update(repr(value).encode())
+    else:
+        raise _Unidentifiable()
+
+
+def identity(rule: t.Callable[[Word], Word]) -> str | None:
+    """
+    A stable identity for a rule: its qualified name and a hash of its code and
+    the globals it reads, or its repr for declarative rules like `Rule` and
+    `Change`. None if the rule can not be identified, in which case it is never
+    cached.
+    """
+    digest = hashlib.sha256()
+    name = getattr(rule, "__qualname__", type(rule).__qualname__)
+    digest.update(f"{getattr(rule, '__module__', '')}.{name}".encode())
+
+    try:
+        if isinstance(rule, ResyllabifyRule):
+            digest.update(repr((rule.onset, rule.nucleus, rule.coda)).encode())
+            _function(rule.function, digest, set())
+        elif isinstance(rule, SegmentRule):
+            digest.update(b"context free" if rule.context_free else b"")
+            _function(rule.function, digest, set())
+        elif isinstance(rule, types.FunctionType):
+            _function(rule, digest, set())
+        elif type(rule).__repr__ is not object.__repr__:
+            digest.update(repr(rule).encode())
+        else:
+            return None
+    except _Unidentifiable:
+        return None
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    Checkpoints of a lexicon after each rule of a cascade, stored on disk.
+
+    The key of the input is a hash of its contents, and the key after each rule
+    hashes the key before it with the identity of the rule. `run` loads the last
+    checkpoint it finds and only applies the rules after it, so when one rule is
+    edited the rules before it are not run again.
+
+    The least recently used checkpoints are deleted once the directory holds more
+    than `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1 << 30) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.lexicon")
+
+    def keys(
+        self, lexicon: Lexicon, rules: list[t.Callable[[Word], Word]]
+    ) -> list[str | None]:
+        """
+        The key of the input followed by the key after each rule. Keys after a
+        rule without an identity are None.
+        """
+        key: str | None = fingerprint(lexicon)
+        output = [key]
+        for rule in rules:
+            rule_identity = identity(rule)
+            if key is None or rule_identity is None:
+                key = None
+            else:
+                key = hashlib.sha256(f"{key}:{rule_identity}".encode()).hexdigest()
+            output.append(key)
+        return output
+
+    def load(self, key: str) -> Lexicon | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                lexicon = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path)
+        return lexicon
+
+    def save(self, key: str, lexicon: Lexicon) -> None:
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as f:
+            pickle.dump(lexicon, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self._path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".lexicon"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def size(self) -> int:
+        return sum(
+            entry.stat().st_size
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(".lexicon")
+        )
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".lexicon"):
+                os.remove(entry.path)
+
+    def run(
+        self, words: Lexicon | t.Iterable[Word], *rules: t.Callable[[Word], Word]
+    ) -> Lexicon:
+        """
+        Apply rules to every word, starting from the last cached checkpoint and
+        saving a checkpoint after every rule that runs.
+        """
+        lexicon = words if isinstance(words, Lexicon) else Lexicon(words)
+        rules_list = Chain(*rules).rules
+        keys = self.keys(lexicon, rules_list)
+
+        start = 0
+        for index in range(len(rules_list), 0, -1):
+            key = keys[index]
+            if key is None:
+                continue
+            cached = self.load(key)
+            if cached is not None:
+                lexicon, start = cached, index
+                break
+
+        for index in range(start, len(rules_list)):
+            lexicon = lexicon.then(rules_list[index])
+            key = keys[index + 1]
+            if key is not None:
+                self.save(key, lexicon)
+        return lexicon
@@ -0,0 +1,227 @@
+from __future__ import annotations
+import typing as t
+
+from washitsu import (
+    Feature,
+    HigherOrderFunction,
+    Not,
+    Segment,
+    Syllable,
+    Word,
+    optional,
+    repeat,
+    requires,
+)
+
+__all__ = ["Rule", "boundary"]
+
+# Matches the edge of a word in a rule context, like `#` in `A > B / # _`.
+boundary = Feature("Boundary")
+
+
+class _Element:
+    def __init__(self, predicate: HigherOrderFunction, bit: int) -> None:
+        self.predicate = predicate
+        self.bit = bit
+        self.optional = requires(predicate, optional)
+        self.repeat = requires(predicate, repeat)
+        self.boundary = predicate is boundary
+
+
+class _Automaton:
+    """
+    A deterministic automaton for "anything, then `elements`", built lazily from
+    the subsets of an NFA with one state per element. It is fed segment classes
+    and says after each one whether the input read so far ends in a match.
+    """
+
+    def __init__(self, elements: list[_Element]) -> None:
+        self.elements = elements
+        self.final = 1 << len(elements)
+        self.start = self._closure(1)
+        self.transitions: dict[tuple[int, int], int] = {}
+
+    def _closure(self, states: int) -> int:
+        for index, element in enumerate(self.elements):
+            if states >> index & 1 and element.optional:
+                states |= 1 << (index + 1)
+        return states
+
+    def step(self, states: int, cls: int) -> int:
+        try:
+            return self.transitions[states, cls]
+        except KeyError:
+            pass
+
+        output = 1
+        for index, element in enumerate(self.elements):
+            if not cls >> element.bit & 1:
+                continue
+            if states >> index & 1:
+                output |= 1 << (index + 1)
+            if element.repeat and states >> (index + 1) & 1:
+                output |= 1 << (index + 1)
+
+        output = self._closure(output)
+        self.transitions[states, cls] = output
+        return output
+
+    def run(self, classes: t.Iterable[int]) -> list[bool]:
+        """
+        For each class read, whether the input up to and including it matches.
+        """
+        output = []
+        states = self.start
+        for cls in classes:
+            states = self.step(states, cls)
+            output.append(states & self.final != 0)
+        return output
+
+
+class Rule:
+    """
+    A declarative sound change, `target > change / before _ after`.
+
+    `target` is a predicate for the segment that changes. `change` is one of:
+    - a list of features to add, with `-feature` for features to remove
+    - a `Segment` or list of `Segment`s that replace the target
+    - `None`, which deletes the target
+
+    `before` and `after` are lists of predicates for the neighbouring segments.
+    `boundary` matches the edge of the word. As in syllable templates, an element
+    made with `& optional` may be skipped and one made with `& repeat` may match
+    more than once.
+
+    The contexts are compiled to automata over segment classes, so a rule visits
+    each segment of a word a fixed number of times. Rules without contexts are
+    context free and are fused by `chain`.
+    """
+
+    def __init__(
+        self,
+        target: HigherOrderFunction,
+        change: list[HigherOrderFunction] | Segment | list[Segment] | None,
+        before: t.Sequence[HigherOrderFunction] = (),
+        after: t.Sequence[HigherOrderFunction] = (),
+    ) -> None:
+        self.target = target
+        self.change = change
+        self.before = list(before)
+        self.after = list(after)
+        self.context_free = not self.before and not self.after
+        self.trigger = target
+        self.__name__ = repr(self)
+
+        atoms: list[HigherOrderFunction] = [target]
+        for predicate in [*self.before, *self.after]:
+            if predicate is not boundary and predicate not in atoms:
+                atoms.append(predicate)
+        self.atoms = atoms
+        self.boundary_class = 1 << len(atoms)
+        self._classes: dict[int, int] = {}
+
+        def element(predicate):
+            if predicate is boundary:
+                return _Element(predicate, len(atoms))
+            return _Element(predicate, atoms.index(predicate))
+
+        self._left = _Automaton([element(p) for p in self.before])
+        self._right = _Automaton([element(p) for p in reversed(self.after)])
+
+        self.add = 0
+        self.remove = 0
+        self.replacement: tuple[Segment, ...] | None = None
+        if change is None:
+            self.replacement = ()
+        elif isinstance(change, Segment):
+            self.replacement = (change,)
+        elif change and all(isinstance(c, Segment) for c in change):
+            self.replacement = tuple(change)
+        else:
+            for feature in change:
+                if isinstance(feature, Not):
+                    self.remove |= feature.arg.mask
+                else:
+                    self.add |= feature.mask
+
+    def __repr__(self):
+        def show(predicates):
+            return " ".join("#" if p is boundary else repr(p) for p in predicates)
+
+        output = f"{self.target!r} > {self.change!r}"
+        if not self.context_free:
+            output += f" / {show(self.before)} _ {show(self.after)}"
+        return output
+
+    def classify(self, segment: Segment) -> int:
+        """
+        The class of a segment: bit `i` is set if it matches `atoms[i]`.
+        """
+        try:
+            return self._classes[segment.mask]
+        except KeyError:
+            mask = segment.mask | optional.mask | repeat.mask
+            cls = 0
+            for index, atom in enumerate(self.atoms):
+                if atom(mask):
+                    cls |= 1 << index
+            self._classes[segment.mask] = cls
+            return cls
+
+    def function(self, word: Word | None, segment: Segment) -> Segment | list[Segment]:
+        """
+        Change a single segment, ignoring the context.
+        """
+        if not self.classify(segment) & 1:
+            return segment
+        if self.replacement is not None:
+            return list(self.replacement)
+        return Segment(segment.ipa_symbol, (segment.mask | self.add) & ~self.remove)
+
+    def __call__(self, word: Word) -> Word:
+        segments = word.flatten()
+        classes = [self.classify(segment) for segment in segments]
+
+        if self.context_free:
+            matched = [cls & 1 == 1 for cls in classes]
+        else:
+            edge = self.boundary_class
+            left = self._left.run([edge, *classes])
+            right = self._right.run([edge, *reversed(classes)])
+            right.reverse()
+            matched = [
+                cls & 1 == 1 and left[index] and right[index + 1]
+                for index, cls in enumerate(classes)
+            ]
+
+        if not any(matched):
+            return word
+
+        position = 0
+        syllables = []
+        for syllable in word.syllables:
+            size = len(syllable.onset) + len(syllable.nucleus) + len(syllable.coda)
+            if not any(matched[position : position + size]):
+                syllables.append(syllable)
+                position += size
+                continue
+
+            parts = []
+            for part in (syllable.onset, syllable.nucleus, syllable.coda):
+                output = []
+                for segment in part:
+                    if not matched[position]:
+                        output.append(segment)
+                    elif self.replacement is not None:
+                        output += self.replacement
+                    else:
+                        output.append(
+                            Segment(
+                                segment.ipa_symbol,
+                                (segment.mask | self.add) & ~self.remove,
+                            )
+                        )
+                    position += 1
+                parts.append(output)
+            syllables.append(Syllable(*parts))
+        return Word(syllables)